@@ -0,0 +1,262 @@
+# Benchmarks of the harness' own overhead (no agents talking to real models).
+#
+#   python benchmarks/bench_harness.py --output bench.json
+#   python benchmarks/bench_harness.py --output new.json --baseline bench.json --max-regression 1.25
+#
+# Every result is a number where lower is better (seconds), except *.per_sec where higher is better.
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import statistics
+import threading
+import contextlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from myctest.config import MycConfig
+from myctest.scenario import get_scenarios, get_scenarios_paths, create_scenario, fill_scenario_with_defaults
+from myctest.observable import Observable, BATCH
+from myctest.environment import Environment
+from myctest.runner import BaseTestRunner
+
+SCENARIO_TEMPLATE = """name: scenario_%(index)d
+iterations: 1
+timeout_sec: 5
+test_runner_path: ./runner.py
+agents:
+  - system_prompt: |
+      You are agent %(index)d.
+    tools:
+      - send_message
+    messages:
+      - content: Hello
+environment:
+  default_state:
+    fs:
+  desired_state_schema:
+    fs:
+      filepath: Hello world
+"""
+
+RUNNER_TEMPLATE = """from myctest.runner import BaseTestRunner
+
+class TestRunner(BaseTestRunner):
+    pass
+"""
+
+def timed(fn, repeat: int = 3) -> float:
+    # best of `repeat`, the least noisy estimate for deterministic work
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def generate_tree(root: str, count: int, fanout: int = 20):
+    # scenarios spread over nested directories, plus excluded directories full of noise
+    for index in range(count):
+        directory = os.path.join(root, "suite_%d" % (index // fanout % fanout), "group_%d" % (index // (fanout * fanout)))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "scenario_%d.myc-scenario.yml" % index), "w") as stream:
+            stream.write(SCENARIO_TEMPLATE % {"index": index})
+        runner_path = os.path.join(directory, "runner.py")
+        if not os.path.exists(runner_path):
+            with open(runner_path, "w") as stream:
+                stream.write(RUNNER_TEMPLATE)
+
+    for excluded in ("venv/lib/site-packages/pkg", "node_modules/pkg/lib", ".git/objects/ab"):
+        directory = os.path.join(root, excluded)
+        os.makedirs(directory, exist_ok=True)
+        for index in range(min(count, 2000)):
+            open(os.path.join(directory, "file_%d.py" % index), "w").close()
+
+    # directory listings modified within the last second are not indexed
+    time.sleep(1.1)
+
+def make_config(root: str) -> MycConfig:
+    config = MycConfig()
+    config.root_dir = root
+    return config
+
+def bench_discovery_and_parsing(results: dict, sizes: list[int]):
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="myctest-bench-")
+        try:
+            generate_tree(root, size)
+            config = make_config(root)
+            cache_dir = os.path.join(root, config.cache_dir)
+            paths_args = (root, config.scenarios_configs_patterns, config.scenarios_exclude_dirs_patterns)
+            index_path = os.path.join(cache_dir, "discovery-index.json")
+
+            results["discovery.uncached.n=%d" % size] = timed(lambda: list(get_scenarios_paths(*paths_args)))
+            list(get_scenarios_paths(*paths_args, index_path))
+            results["discovery.indexed.n=%d" % size] = timed(lambda: list(get_scenarios_paths(*paths_args, index_path)))
+
+            def parse_uncached():
+                shutil.rmtree(cache_dir, ignore_errors=True)
+                get_scenarios(config)
+
+            results["parse_validate.uncached.n=%d" % size] = timed(parse_uncached, repeat=1 if size >= 1000 else 3)
+            get_scenarios(config)
+            results["parse_validate.cached.n=%d" % size] = timed(lambda: get_scenarios(config))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+def make_scenario(iterations: int, agents: int, timeout_sec: int = 5):
+    scenario_config = {
+        "name": "synthetic",
+        "iterations": iterations,
+        "test_runner_path": "runner.py",
+        "agents": [{"system_prompt": "agent %d" % index} for index in range(agents)],
+        "environment": {
+            "default_state": {"fs": {}},
+            "desired_state_schema": {"fs": {"done": True}},
+        },
+    }
+    fill_scenario_with_defaults(scenario_config, MycConfig())
+    scenario_config["timeout_sec"] = timeout_sec
+    return create_scenario(scenario_config, os.path.join(os.getcwd(), "synthetic.myc-scenario.yml"), MycConfig())
+
+class SyntheticRunner(BaseTestRunner):
+    # every agent executes `actions` writes, the last one satisfies desired_state_schema
+    actions = 10
+
+    def before(self, scenario, environment):
+        environment.register_action("write", lambda env, key, value: env.state.set_in(("fs", key), value))
+
+    def before_iteration(self, scenario, environment, iteration):
+        agents = len(scenario.agents)
+        for action in range(self.actions):
+            for agent in range(agents):
+                environment.execute_action("write", "agent_%d_%d" % (agent, action), action)
+        environment.execute_action("write", "done", True)
+
+def bench_iterations(results: dict, agents: int, actions: int, iterations: int):
+    SyntheticRunner.actions = actions
+    runner = SyntheticRunner(make_scenario(iterations, agents))
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        runner.run()
+        elapsed = time.perf_counter() - start
+
+    executed = iterations * (agents * actions + 1)
+    results["iteration.mean_sec.agents=%d.actions=%d" % (agents, actions)] = elapsed / iterations
+    results["iteration.actions.per_sec.agents=%d.actions=%d" % (agents, actions)] = executed / elapsed
+
+class DelayedPassRunner(BaseTestRunner):
+    delay_sec = 0.05
+
+    def before_iteration(self, scenario, environment, iteration):
+        threading.Timer(self.delay_sec, lambda: environment.state.set_in(("fs", "done"), True)).start()
+
+def bench_pass_detection(results: dict, iterations: int):
+    runner = DelayedPassRunner(make_scenario(iterations, 1))
+    with contextlib.redirect_stdout(io.StringIO()):
+        measured = runner.run()
+
+    # time from the state change to the iteration being reported as passed
+    latencies = [iteration.time - DelayedPassRunner.delay_sec for iteration in measured]
+    results["pass_detection.latency_sec.p50"] = statistics.median(latencies)
+    results["pass_detection.latency_sec.max"] = max(latencies)
+
+def bench_events(results: dict, subscribers: int, events: int):
+    observable = Observable(["action.executed"])
+    for _ in range(subscribers):
+        observable.on("action.executed", lambda *_: None)
+
+    def emit():
+        for index in range(events):
+            observable.emit("action.executed", "write", index)
+
+    results["events.emit.per_sec.subscribers=%d" % subscribers] = events / timed(emit)
+
+    # batched subscribers run on the dispatcher thread, the emitting side only enqueues
+    batched = Observable(["action.executed"])
+    for _ in range(subscribers):
+        batched.on("action.*", lambda batch: None, BATCH)
+
+    def emit_batched():
+        for index in range(events):
+            batched.emit("action.executed", "write", index)
+        batched.flush()
+
+    results["events.emit_batched.per_sec.subscribers=%d" % subscribers] = events / timed(emit_batched)
+
+    environment = Environment(make_scenario(1, 1).environment)
+    environment.register_action("write", lambda env, key, value: env.state.set(key, value))
+
+    def execute():
+        for index in range(events):
+            environment.execute_action("write", index % 1000, index)
+
+    results["events.execute_action.per_sec"] = events / timed(execute)
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    regressions = []
+    for name, value in sorted(results.items()):
+        if name not in baseline or not baseline[name] or not value:
+            continue
+        higher_is_better = ".per_sec" in name
+        ratio = baseline[name] / value if higher_is_better else value / baseline[name]
+        marker = ""
+        if ratio > max_regression:
+            regressions.append(name)
+            marker = "  REGRESSION"
+        print("%-60s %12.6g  baseline %12.6g  x%.2f%s" % (name, value, baseline[name], ratio, marker))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the myctest harness overhead")
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma separated numbers of synthetic scenario files")
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--actions", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--events", type=int, default=100000)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.2, help="fail when a result is this many times worse than the baseline")
+    args = parser.parse_args()
+
+    results = {}
+    bench_discovery_and_parsing(results, [int(size) for size in args.sizes.split(",") if size])
+    bench_iterations(results, args.agents, args.actions, args.iterations)
+    bench_pass_detection(results, args.iterations)
+    bench_events(results, 1, args.events)
+    bench_events(results, 10, args.events)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w") as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline, "r") as stream:
+            baseline = json.load(stream)["results"]
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print("%d regression(s) over x%.2f" % (len(regressions), args.max_regression))
+            sys.exit(1)
+    else:
+        for name, value in sorted(results.items()):
+            print("%-60s %12.6g" % (name, value))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,8 @@ load_dotenv()
 
 from myctest.runner import BaseTestRunner
 from myctest.environment import Environment
-from myctest.agent import Agent, ToolsService
+from experiments.agent import Agent
+from myctest.tools import ToolsService
 
 agents = {}
 
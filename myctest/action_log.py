@@ -0,0 +1,304 @@
+import os
+import sys
+import json
+import mmap
+import time
+import threading
+import itertools
+from array import array
+from collections import Counter
+from typing import Optional
+from myctest.context import current_agent
+
+# Append-only columnar log of executed actions, one directory per scenario:
+#
+#   ts.q           int64   time.time_ns() of the action
+#   iteration.i    int32   iteration index, -1 outside of iterations
+#   agent.i        int32   id in strings.jsonl of the agent that executed the action, -1 if unknown
+#   action.i       int32   id in strings.jsonl of the action name
+#   args_offset.q  int64   offset in args.bin of the JSON encoded arguments, they end where the next row's begin
+#   args.bin               concatenated JSON arrays
+#   strings.jsonl          one JSON string per line, the id is the line number
+#
+# Columns are written with array.tofile and read back through mmap + memoryview.cast, so scanning a
+# column does not materialize it. Strings are written before the rows that reference them.
+
+VERSION = 1
+COLUMNS = (("ts", "q"), ("iteration", "i"), ("agent", "i"), ("action", "i"), ("args_offset", "q"))
+COLUMN_TYPES = dict(COLUMNS)
+
+def column_path(directory: str, name: str) -> str:
+    return os.path.join(directory, "%s.%s" % (name, COLUMN_TYPES[name]))
+
+_encoder = json.JSONEncoder(separators=(",", ":"), default=repr)
+
+def encode_args(args) -> bytes:
+    return _encoder.encode(list(args)).encode()
+
+class ActionLogWriter:
+    def __init__(self, directory: str, flush_every: int = 4096):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_every = flush_every
+        self.lock = threading.Lock()
+        self.rows = []
+
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r") as stream:
+                meta = json.load(stream)
+            if meta.get("version") != VERSION or meta.get("byteorder") != sys.byteorder:
+                raise Exception("Action log %s was written in an incompatible format" % directory)
+        else:
+            with open(meta_path, "w") as stream:
+                json.dump({"version": VERSION, "byteorder": sys.byteorder, "columns": dict(COLUMNS)}, stream)
+
+        self.strings = {}
+        self.new_strings = []
+        strings_path = os.path.join(directory, "strings.jsonl")
+        if os.path.exists(strings_path):
+            with open(strings_path, "r") as stream:
+                for line in stream:
+                    self.strings[json.loads(line)] = len(self.strings)
+
+        # a writer that was killed mid-flush can leave columns of different lengths, appending to them
+        # would shift every later row; the log is cut back to the rows written to every column
+        self._truncate_incomplete_rows()
+
+        self.columns = {name: open(column_path(directory, name), "ab") for name, _ in COLUMNS}
+        self.args_file = open(os.path.join(directory, "args.bin"), "ab")
+        self.strings_file = open(strings_path, "a")
+        self.args_offset = self.args_file.tell()
+
+    def _truncate_incomplete_rows(self):
+        paths = {name: column_path(self.directory, name) for name, _ in COLUMNS}
+        sizes = {name: os.path.getsize(path) if os.path.exists(path) else 0 for name, path in paths.items()}
+        length = min(sizes[name] // array(code).itemsize for name, code in COLUMNS)
+        for name, code in COLUMNS:
+            if sizes[name] > length * array(code).itemsize:
+                os.truncate(paths[name], length * array(code).itemsize)
+
+        # args are written before the columns, the args of the last complete row end the blob
+        args_path = os.path.join(self.directory, "args.bin")
+        if not os.path.exists(args_path):
+            return
+        args_end = 0
+        if length:
+            offsets = array("q")
+            with open(paths["args_offset"], "rb") as stream:
+                stream.seek((length - 1) * offsets.itemsize)
+                offsets.frombytes(stream.read(offsets.itemsize))
+            with open(args_path, "rb") as stream:
+                stream.seek(offsets[0])
+                # encode_args output is ASCII, so the decoded length is the length in bytes
+                args_end = offsets[0] + _decoder.raw_decode(stream.read().decode())[1]
+        if os.path.getsize(args_path) > args_end:
+            os.truncate(args_path, args_end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False
+
+    def subscriber(self, iteration_index: Optional[int] = None):
+        # an "action.executed" callback, the agent is taken from the context of the emitting thread or task
+        def on_action_executed(action, *args):
+            self.append(action, args, iteration_index, current_agent.get())
+        return on_action_executed
+
+    def append(self, action: str, args: tuple = (), iteration_index: Optional[int] = None, agent_id: Optional[str] = None):
+        row = (time.time_ns(), -1 if iteration_index is None else iteration_index, agent_id, action, args)
+        with self.lock:
+            self.rows.append(row)
+            if len(self.rows) < self.flush_every:
+                return
+            rows, self.rows = self.rows, []
+            self._write(rows)
+
+    def flush(self):
+        with self.lock:
+            rows, self.rows = self.rows, []
+            self._write(rows)
+
+    def close(self):
+        self.flush()
+        for stream in [*self.columns.values(), self.args_file, self.strings_file]:
+            stream.close()
+
+    def _intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        string_id = self.strings.get(value)
+        if string_id is None:
+            string_id = self.strings[value] = len(self.strings)
+            self.new_strings.append(value)
+        return string_id
+
+    def _write(self, rows: list):
+        if not rows:
+            return
+
+        timestamps, iterations, agents, actions, args = zip(*rows)
+        encoded_args = [encode_args(item) for item in args]
+        offsets = itertools.accumulate((len(item) for item in encoded_args[:-1]), initial=self.args_offset)
+        columns = {
+            "ts": array("q", timestamps),
+            "iteration": array("i", iterations),
+            "agent": array("i", [self._intern(str(agent_id) if agent_id is not None else None) for agent_id in agents]),
+            "action": array("i", [self._intern(action) for action in actions]),
+            "args_offset": array("q", offsets),
+        }
+        blob = b"".join(encoded_args)
+
+        if self.new_strings:
+            self.strings_file.write("".join(json.dumps(value) + "\n" for value in self.new_strings))
+            self.strings_file.flush()
+            self.new_strings = []
+
+        self.args_file.write(blob)
+        self.args_file.flush()
+        self.args_offset += len(blob)
+
+        for name, _ in COLUMNS:
+            columns[name].tofile(self.columns[name])
+            self.columns[name].flush()
+
+_decoder = json.JSONDecoder()
+
+class ActionLogReader:
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, "meta.json"), "r") as stream:
+            meta = json.load(stream)
+        if meta.get("version") != VERSION or meta.get("byteorder") != sys.byteorder:
+            raise Exception("Action log %s was written in an incompatible format" % directory)
+
+        self.directory = directory
+        with open(os.path.join(directory, "strings.jsonl"), "r") as stream:
+            self.strings = [json.loads(line) for line in stream]
+        self.string_ids = {value: string_id for string_id, value in enumerate(self.strings)}
+
+        self._maps = []
+        self._mapped_views = []
+        self._views = {}
+        raw = {name: self._map(column_path(directory, name)) for name, _ in COLUMNS}
+        # a writer that was killed mid-flush can leave columns of different lengths
+        self.length = min(len(view) // array(COLUMN_TYPES[name]).itemsize for name, view in raw.items())
+        for name, view in raw.items():
+            itemsize = array(COLUMN_TYPES[name]).itemsize
+            self._views[name] = view[:self.length * itemsize].cast(COLUMN_TYPES[name])
+        self.args_blob = self._map(os.path.join(directory, "args.bin"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+        return False
+
+    def __len__(self):
+        return self.length
+
+    def _map(self, path: str) -> memoryview:
+        with open(path, "rb") as stream:
+            if os.fstat(stream.fileno()).st_size == 0:
+                return memoryview(b"")
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(mapped)
+        self._maps.append(mapped)
+        self._mapped_views.append(view)
+        return view
+
+    def close(self):
+        for view in self._views.values():
+            view.release()
+        self._views = {}
+        # a mapping can only be closed once no view exports it anymore
+        for view in self._mapped_views:
+            view.release()
+        self._mapped_views = []
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def column(self, name: str) -> memoryview:
+        # zero-copy view over the mapped column file
+        return self._views[name]
+
+    def rows(
+        self,
+        iteration: Optional[int] = None,
+        agent: Optional[str] = None,
+        action: Optional[str] = None,
+        since_ns: Optional[int] = None,
+        until_ns: Optional[int] = None,
+    ):
+        # indices of matching rows, streamed over the mapped columns
+        filters = []
+        if iteration is not None:
+            filters.append((self._views["iteration"], iteration))
+        for name, value in (("agent", agent), ("action", action)):
+            if value is not None:
+                if value not in self.string_ids:
+                    return
+                filters.append((self._views[name], self.string_ids[value]))
+
+        timestamps = self._views["ts"] if since_ns is not None or until_ns is not None else None
+        candidates = range(self.length)
+        if filters:
+            # the first filter is a single pass over one column, the rest are only checked on its hits
+            column, expected = filters[0]
+            candidates = (row for row, value in enumerate(column) if value == expected)
+
+        for row in candidates:
+            if any(column[row] != expected for column, expected in filters[1:]):
+                continue
+            if timestamps is not None:
+                ts = timestamps[row]
+                if (since_ns is not None and ts < since_ns) or (until_ns is not None and ts >= until_ns):
+                    continue
+            yield row
+
+    def count(self, **filters) -> int:
+        return sum(1 for _ in self.rows(**filters))
+
+    def count_by(self, column: str, **filters) -> Counter:
+        # e.g. count_by("action", iteration=3) -> Counter({"write": 120, "send_message": 8})
+        view = self._views[column]
+        if filters:
+            counts = Counter(view[row] for row in self.rows(**filters))
+        else:
+            counts = Counter(view)
+        if column in ("agent", "action"):
+            return Counter({self.strings[key] if key >= 0 else None: value for key, value in counts.items()})
+        return counts
+
+    def args(self, row: int) -> list:
+        offsets = self._views["args_offset"]
+        end = offsets[row + 1] if row + 1 < self.length else len(self.args_blob)
+        # raw_decode stops after the first value, args.bin can end with bytes of rows that were never completed
+        return _decoder.raw_decode(bytes(self.args_blob[offsets[row]:end]).decode())[0]
+
+    def record(self, row: int) -> dict:
+        agent_id = self._views["agent"][row]
+        iteration_index = self._views["iteration"][row]
+        return {
+            "ts": self._views["ts"][row],
+            "iteration": iteration_index if iteration_index >= 0 else None,
+            "agent": self.strings[agent_id] if agent_id >= 0 else None,
+            "action": self.strings[self._views["action"][row]],
+            "args": self.args(row),
+        }
+
+    def records(self, **filters):
+        for row in self.rows(**filters):
+            yield self.record(row)
+
+def read_action_logs(directory: str) -> dict[str, ActionLogReader]:
+    # every scenario's log of a run directory written by `myc-test --action-log DIR`
+    return {
+        name: ActionLogReader(os.path.join(directory, name))
+        for name in sorted(os.listdir(directory))
+        if os.path.exists(os.path.join(directory, name, "meta.json"))
+    }
@@ -0,0 +1,105 @@
+import asyncio
+from typing import Optional
+from myctest.bus import MessageBus, DROP_NEWEST
+from myctest.context import current_agent
+from myctest import tracing
+
+# put in the inbox by the message bus when the agent's mailbox becomes non-empty
+_BUS_WAKEUP = object()
+
+class AsyncAgent:
+    # Base class for agents running as asyncio tasks. The agent sleeps on its inbox and is woken
+    # only when a message arrives, so thousands of idle agents cost nothing but memory.
+    # Subclasses implement process_messages().
+    def __init__(self, id: str, inbox_size: int = 0):
+        self.id = id
+        self.inbox = asyncio.Queue(inbox_size)
+        self.stopped = False
+        self.task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.bus: Optional[MessageBus] = None
+        self.max_batch: Optional[int] = None
+
+    @property
+    def is_running(self) -> bool:
+        return not self._idle.is_set()
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.task = self._loop.create_task(self.run(), name="agent:%s" % self.id)
+
+    async def stop(self):
+        self.stopped = True
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def connect(self, bus: MessageBus, max_batch: Optional[int] = None, **mailbox_options):
+        # messages sent to the agent over the bus are received in batches of at most max_batch;
+        # senders share the agent's event loop, so a full mailbox drops instead of blocking by default
+        self.bus = bus
+        self.max_batch = max_batch
+        mailbox_options.setdefault("policy", DROP_NEWEST)
+        bus.register(self.id, on_ready=lambda: self.send_message(_BUS_WAKEUP), **mailbox_options)
+
+    def send_message(self, message):
+        # safe to call from the agent's event loop as well as from other threads
+        if self._loop is not None and not self._is_loop_thread():
+            self._loop.call_soon_threadsafe(self._deliver, message)
+        else:
+            self._deliver(message)
+
+    def _deliver(self, message):
+        self._idle.clear()
+        self.inbox.put_nowait(message)
+
+    def _is_loop_thread(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    async def wait_idle(self):
+        await self._idle.wait()
+
+    async def run(self):
+        # the task runs in its own copy of the context, ids set here tag everything the agent does
+        current_agent.set(self.id)
+        while not self.stopped:
+            messages = [await self.inbox.get()]
+            # everything that arrived while the agent was busy is handled as one batch
+            while not self.inbox.empty():
+                messages.append(self.inbox.get_nowait())
+
+            if self.bus is not None and _BUS_WAKEUP in messages:
+                messages = [message for message in messages if message is not _BUS_WAKEUP]
+                messages.extend(self.bus.receive(self.id, self.max_batch))
+
+            try:
+                if messages:
+                    with tracing.span("agent.process_messages", "agent", messages=len(messages)):
+                        await self.process_messages(messages)
+            finally:
+                if self.bus is not None and self.bus.pending(self.id):
+                    self._deliver(_BUS_WAKEUP)
+                elif self.inbox.empty():
+                    self._idle.set()
+
+    async def process_messages(self, messages: list):
+        raise NotImplementedError()
+
+def start_agents(agents: list[AsyncAgent]):
+    for agent in agents:
+        agent.start()
+
+async def stop_agents(agents: list[AsyncAgent]):
+    await asyncio.gather(*(agent.stop() for agent in agents))
+
+async def wait_for_agents(agents: list[AsyncAgent]):
+    await asyncio.gather(*(agent.wait_idle() for agent in agents))
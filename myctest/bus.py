@@ -0,0 +1,231 @@
+import time
+import asyncio
+import threading
+from collections import deque, Counter
+from typing import Optional, Callable
+from myctest.observable import Observable
+
+BROADCAST = "*"
+
+# what happens when a recipient's queue is full
+BLOCK = "block"              # sender waits until there is room (up to block_timeout_sec, then the message is dropped),
+                             # except on a running event loop, which would stop the recipient from draining; see send_async
+DROP_NEWEST = "drop_newest"  # the new message is dropped
+DROP_OLDEST = "drop_oldest"  # the oldest queued message is dropped to make room
+REJECT = "reject"            # the new message is dropped and send raises MessageBusFull
+
+BACKPRESSURE_POLICIES = (BLOCK, DROP_NEWEST, DROP_OLDEST, REJECT)
+
+# events the bus emits through its observable, Environment supports all of them
+MESSAGE_EVENTS = ["message.sent", "message.delivered", "message.dropped"]
+
+class MessageBusFull(Exception):
+    pass
+
+class Message:
+    __slots__ = ("sender", "recipient", "topic", "content", "timestamp")
+
+    def __init__(self, sender: str, recipient: str, topic: Optional[str], content):
+        self.sender = sender
+        self.recipient = recipient
+        self.topic = topic
+        self.content = content
+        self.timestamp = time.monotonic()
+
+    def __repr__(self):
+        return "Message(%s -> %s%s: %r)" % (self.sender, self.recipient, " #%s" % self.topic if self.topic else "", self.content)
+
+class Mailbox:
+    __slots__ = ("queue", "maxsize", "policy", "on_ready", "not_full")
+
+    def __init__(self, maxsize: int, policy: str, on_ready: Optional[Callable], lock: threading.Lock):
+        self.queue = deque()
+        self.maxsize = maxsize
+        self.policy = policy
+        self.on_ready = on_ready
+        self.not_full = threading.Condition(lock)
+
+class MessageBus:
+    # Thread-safe in-process bus between agents. Every agent has a bounded mailbox; messages are
+    # pulled in batches with receive(), and on_ready (called outside of the bus lock) is the hook to
+    # wake the recipient, e.g. AsyncAgent.send_message or setting a threading.Event.
+    def __init__(
+        self,
+        observable: Optional[Observable] = None,
+        maxsize: int = 1000,
+        policy: str = BLOCK,
+        block_timeout_sec: Optional[float] = 10,
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise Exception("Backpressure policy %s not supported" % policy)
+
+        self.observable = observable
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout_sec = block_timeout_sec
+        self.lock = threading.Lock()
+        self.mailboxes: dict[str, Mailbox] = {}
+        self.topics: dict[str, set[str]] = {}
+        # (sender, recipient) -> count, delivered means received by the recipient
+        self.sent = Counter()
+        self.delivered = Counter()
+        self.dropped = Counter()
+
+    def register(self, agent_id: str, on_ready: Optional[Callable] = None, maxsize: Optional[int] = None, policy: Optional[str] = None):
+        policy = policy or self.policy
+        if policy not in BACKPRESSURE_POLICIES:
+            raise Exception("Backpressure policy %s not supported" % policy)
+
+        with self.lock:
+            self.mailboxes[agent_id] = Mailbox(maxsize or self.maxsize, policy, on_ready, self.lock)
+
+    def unregister(self, agent_id: str):
+        with self.lock:
+            mailbox = self.mailboxes.pop(agent_id, None)
+            for members in self.topics.values():
+                members.discard(agent_id)
+            if mailbox is not None:
+                mailbox.not_full.notify_all()
+
+    def join(self, topic: str, agent_id: str):
+        with self.lock:
+            self.topics.setdefault(topic, set()).add(agent_id)
+
+    def leave(self, topic: str, agent_id: str):
+        with self.lock:
+            self.topics.get(topic, set()).discard(agent_id)
+
+    def send(self, sender: str, recipient: str, content) -> bool:
+        return self._send_many(sender, [recipient], None, content) == 1
+
+    async def send_async(self, sender: str, recipient: str, content, poll_interval_sec: float = 0.01) -> bool:
+        # send for agents on an event loop: waits for room in a BLOCK mailbox without blocking the loop
+        deadline = None if self.block_timeout_sec is None else time.monotonic() + self.block_timeout_sec
+        while deadline is None or time.monotonic() < deadline:
+            with self.lock:
+                mailbox = self.mailboxes.get(recipient)
+                if mailbox is None or mailbox.policy != BLOCK or len(mailbox.queue) < mailbox.maxsize:
+                    break
+            await asyncio.sleep(poll_interval_sec)
+        return self.send(sender, recipient, content)
+
+    def publish(self, sender: str, topic: str, content) -> int:
+        with self.lock:
+            recipients = [agent_id for agent_id in self.topics.get(topic, ()) if agent_id != sender]
+        return self._send_many(sender, sorted(recipients), topic, content, skip_missing=True)
+
+    def broadcast(self, sender: str, content) -> int:
+        with self.lock:
+            recipients = [agent_id for agent_id in self.mailboxes if agent_id != sender]
+        return self._send_many(sender, recipients, BROADCAST, content, skip_missing=True)
+
+    def _send_many(self, sender: str, recipients: list[str], topic: Optional[str], content, skip_missing: bool = False) -> int:
+        # skip_missing is for recipients resolved before taking the lock, they may unregister in between
+        ready = []
+        events = []
+        rejected = []
+        queued = 0
+
+        try:
+            with self.lock:
+                if not skip_missing:
+                    missing = [recipient for recipient in recipients if recipient not in self.mailboxes]
+                    if missing:
+                        raise Exception("Agent %s is not registered on the message bus" % ", ".join(missing))
+
+                for recipient in recipients:
+                    # BLOCK releases the lock while waiting, so this is checked for every recipient
+                    mailbox = self.mailboxes.get(recipient)
+                    if mailbox is None:
+                        continue
+
+                    message = Message(sender, recipient, topic, content)
+                    edge = (sender, recipient)
+                    self.sent[edge] += 1
+                    events.append(("message.sent", message))
+
+                    if len(mailbox.queue) >= mailbox.maxsize and not self._make_room(mailbox, message, events, ready):
+                        if mailbox.policy == REJECT:
+                            rejected.append(recipient)
+                        continue
+
+                    was_empty = not mailbox.queue
+                    mailbox.queue.append(message)
+                    queued += 1
+                    if was_empty and mailbox.on_ready is not None:
+                        ready.append(mailbox.on_ready)
+        finally:
+            self._flush(events, ready)
+
+        if rejected:
+            raise MessageBusFull("Mailbox of agent(s) %s is full" % ", ".join(rejected))
+
+        return queued
+
+    def _flush(self, events: list, ready: list):
+        # callbacks run outside of the lock, so subscribers and wake-ups can use the bus themselves;
+        # on_ready only fires when a mailbox becomes non-empty, a missed one would never come again
+        try:
+            for event, message in events:
+                self._emit(event, message)
+        finally:
+            events.clear()
+            for on_ready in ready:
+                on_ready()
+            ready.clear()
+
+    def _make_room(self, mailbox: Mailbox, message: Message, events: list, ready: list) -> bool:
+        if mailbox.policy == DROP_OLDEST:
+            dropped = mailbox.queue.popleft()
+            self.dropped[(dropped.sender, dropped.recipient)] += 1
+            events.append(("message.dropped", dropped))
+            return True
+
+        # waiting on the event loop's thread would keep the recipient from ever draining its mailbox
+        if mailbox.policy == BLOCK and asyncio._get_running_loop() is None:
+            # recipients already queued are woken before waiting, one of them may be the one to drain this mailbox
+            if events or ready:
+                self.lock.release()
+                try:
+                    self._flush(events, ready)
+                finally:
+                    self.lock.acquire()
+            has_room = mailbox.not_full.wait_for(
+                lambda: len(mailbox.queue) < mailbox.maxsize or self.mailboxes.get(message.recipient) is not mailbox,
+                self.block_timeout_sec,
+            )
+            if has_room and self.mailboxes.get(message.recipient) is mailbox:
+                return True
+
+        self.dropped[(message.sender, message.recipient)] += 1
+        events.append(("message.dropped", message))
+        return False
+
+    def receive(self, agent_id: str, max_batch: Optional[int] = None) -> list[Message]:
+        with self.lock:
+            mailbox = self.mailboxes[agent_id]
+            count = len(mailbox.queue) if max_batch is None else min(max_batch, len(mailbox.queue))
+            messages = [mailbox.queue.popleft() for _ in range(count)]
+            if messages:
+                mailbox.not_full.notify_all()
+            for message in messages:
+                self.delivered[(message.sender, message.recipient)] += 1
+
+        for message in messages:
+            self._emit("message.delivered", message)
+        return messages
+
+    def pending(self, agent_id: str) -> int:
+        return len(self.mailboxes[agent_id].queue)
+
+    def _emit(self, event: str, message: Message):
+        if self.observable is not None:
+            self.observable.emit(event, message)
+
+    def stats(self) -> dict:
+        with self.lock:
+            edges = set(self.sent) | set(self.dropped)
+            return {
+                edge: {"sent": self.sent[edge], "delivered": self.delivered[edge], "dropped": self.dropped[edge]}
+                for edge in edges
+            }
@@ -1,25 +1,210 @@
 import os
 import typer
-from myctest.scenario import get_scenarios
-from myctest.runner import import_test_runner
+from typing import Optional
 from myctest.config import MycConfig
-from rich import print
+from myctest.entry import get_config
+
+# everything else (yaml, schema, runners, process pool) is imported only once scenarios are about to run
 
 app = typer.Typer(invoke_without_command=True)
 
+SelectOption = typer.Option(None, "--select", "-k", help="Only scenarios whose path or name contains (or glob-matches) this value. Can be repeated")
+
 @app.callback()
-def main():
-    config = MycConfig()
-    config.root_dir = os.getcwd()
+def main(
+    ctx: typer.Context,
+    workers: int = typer.Option(1, "--workers", "-w", min=1, help="Number of scenarios to run in parallel, each in its own process"),
+    select: Optional[list[str]] = SelectOption,
+    record: bool = typer.Option(False, "--record", help="Request LLM completions live and store them in the completion cache"),
+    replay: bool = typer.Option(False, "--replay", help="Serve LLM completions from the completion cache only"),
+    trace: Optional[str] = typer.Option(None, "--trace", help="Record spans and write a Chrome trace and a flame graph per scenario to this directory"),
+    action_log: Optional[str] = typer.Option(None, "--action-log", help="Append every executed action to a columnar log per scenario in this directory"),
+    rpm: Optional[float] = typer.Option(None, "--rpm", min=0, help="Limit LLM requests per minute, shared by all agents and worker processes"),
+    tpm: Optional[float] = typer.Option(None, "--tpm", min=0, help="Limit LLM tokens per minute, shared by all agents and worker processes"),
+    mock_llm: bool = typer.Option(False, "--mock-llm", help="Replace the LLM client with a local mock configured from each agent's metadata.mock_llm"),
+    watch: bool = typer.Option(False, "--watch", help="Keep running and re-run the scenarios affected by changed files"),
+):
+    ctx.obj = {"select": select}
+    if record and replay:
+        raise typer.BadParameter("--record and --replay are mutually exclusive")
+    if mock_llm and (record or replay):
+        raise typer.BadParameter("--mock-llm cannot be combined with --record or --replay")
+
+    # applied before dispatching to a subcommand too, `coordinator` passes them on to its local workers
+    config = get_config()
+    if record or replay:
+        configure_completion_cache(config, "record" if record else "replay")
+
+    if mock_llm:
+        configure_mock_llm()
+
+    if trace:
+        from myctest.executor import TRACE_DIR_ENV
+        os.environ[TRACE_DIR_ENV] = os.path.abspath(trace)
+
+    if action_log:
+        from myctest.executor import ACTION_LOG_DIR_ENV
+        os.environ[ACTION_LOG_DIR_ENV] = os.path.abspath(action_log)
+
+    if rpm or tpm:
+        # workers of a coordinator are separate processes; every worker started on this host with
+        # --rpm/--tpm joins the same state file instead of resetting it
+        subcommand = ctx.invoked_subcommand
+        configure_rate_limit(config, rpm, tpm, workers > 1 or subcommand in ("coordinator", "worker"), reset=subcommand != "worker")
+
+    if ctx.invoked_subcommand is not None:
+        return
+
+    from myctest.scenario import get_scenarios
+    from myctest.executor import run_scenarios
+    from rich import print
+
+    def on_start(result):
+        print(f"Running scenario ./{os.path.relpath(result.scenario_path, config.root_dir)}")
+
+    if watch:
+        from myctest.watch import Watcher
+        try:
+            Watcher(config, select, workers, report=lambda results: print_report(results, config), on_start=on_start).run()
+        except KeyboardInterrupt:
+            return
+
+    scenarios = get_scenarios(config, select)
+
+    results = run_scenarios(scenarios, workers, on_start)
+    print_report(results, config)
+
+    if not all(result.passed for result in results):
+        raise typer.Exit(code=1)
+
+@app.command("list")
+def list_scenarios(ctx: typer.Context, select: Optional[list[str]] = SelectOption):
+    # myc-test itself answers plain `list` command lines in myctest.entry, without importing typer
+    from myctest.entry import list_scenarios
+
+    list_scenarios(get_config(), (ctx.obj or {}).get("select") or select)
+
+@app.command("coordinator")
+def run_coordinator(
+    ctx: typer.Context,
+    host: str = typer.Option("127.0.0.1", "--host", help="Address to listen on, 0.0.0.0 to accept workers from other hosts"),
+    port: int = typer.Option(7470, "--port", help="Port to listen on, 0 picks a free one"),
+    local_workers: int = typer.Option(0, "--local-workers", min=0, help="Number of workers to start on this host"),
+    select: Optional[list[str]] = SelectOption,
+):
+    from myctest.scenario import get_scenarios
+    from myctest.distributed import Coordinator, spawn_local_workers
+
+    config = get_config()
+    select = (ctx.obj or {}).get("select") or select
+    scenarios = get_scenarios(config, select)
+    processes = []
+
+    coordinator = Coordinator(config, scenarios, host, port)
+
+    def on_listening(port):
+        typer.echo("Coordinator listening on %s:%d" % (host, port))
+        processes.extend(spawn_local_workers(local_workers, port, config.root_dir))
+
+    def on_worker_lost(worker_id):
+        # keeps the number of local workers up, bounded so that a scenario killing every worker cannot loop forever
+        if local_workers and len(processes) < local_workers * (1 + coordinator.max_attempts):
+            processes.extend(spawn_local_workers(1, coordinator.port, config.root_dir))
+
+    coordinator.on_worker_lost = on_worker_lost
+    try:
+        results = coordinator.run(on_listening)
+    finally:
+        for process in processes:
+            process.wait()
+
+    print_report(results, config)
+    if not all(result.passed for result in results):
+        raise typer.Exit(code=1)
+
+@app.command("worker")
+def run_worker(connect: str = typer.Option(..., "--connect", help="host:port of the coordinator")):
+    from myctest.distributed import Worker, parse_address
+
+    host, port = parse_address(connect)
+    Worker(get_config(), host, port).run()
+
+def configure_completion_cache(config: MycConfig, mode: str):
+    from myctest import replay
+
+    # environment variables are inherited by worker processes, agents pick them up through replay.wrap_client
+    os.environ[replay.MODE_ENV] = mode
+    os.environ[replay.DIR_ENV] = os.path.join(config.root_dir, config.cache_dir or ".myctest", "llm-cache")
+    os.environ[replay.MAX_BYTES_ENV] = str(config.llm_cache_max_bytes)
+
+def configure_mock_llm():
+    from myctest import replay
+
+    # read by replay.wrap_client in the worker processes
+    os.environ[replay.BACKEND_ENV] = replay.MOCK
+
+def configure_rate_limit(config: MycConfig, rpm: Optional[float], tpm: Optional[float], shared: bool, reset: bool = True):
+    from myctest import scheduler
+
+    if rpm:
+        os.environ[scheduler.RPM_ENV] = str(rpm)
+    if tpm:
+        os.environ[scheduler.TPM_ENV] = str(tpm)
+    if shared:
+        # worker processes share their buckets and deadlines through this file
+        cache_dir = os.path.join(config.root_dir, config.cache_dir or ".myctest")
+        os.makedirs(cache_dir, exist_ok=True)
+        state_path = os.path.join(cache_dir, "ratelimit.json")
+        if reset and os.path.exists(state_path):
+            os.remove(state_path)
+        os.environ[scheduler.STATE_ENV] = state_path
+
+def print_report(results, config: MycConfig):
+    from rich import print
+
+    print("Report:")
+    for result in results:
+        scenario_path = os.path.relpath(result.scenario_path, config.root_dir)
+        if result.error is not None:
+            print(f"[red]CRASHED[/red] ./{scenario_path}")
+            print(result.error)
+            continue
+
+        passed = len([iteration for iteration in result.iterations if iteration.passed])
+        status = "[green]PASSED[/green]" if result.passed else "[red]FAILED[/red]"
+        print(f"{status} ./{scenario_path} ({passed}/{len(result.iterations)} iterations passed)")
+        print_summary(result.summary, result.scenario)
+        for iteration in result.iterations:
+            print("  Iteration %d: %s" % (iteration.index, iteration))
+            for constraint in iteration.unsatisfied_constraints:
+                print("    unsatisfied: %s" % constraint)
+
+def print_summary(summary: dict, scenario):
+    from rich import print
 
-    scenarios = get_scenarios(config)
+    if not summary["total"]:
+        return
 
-    for scenario_path, scenario in scenarios:
-        print(f"Running scenario ./{os.path.relpath(scenario_path, config.root_dir)}")
-        test_runner_cls = import_test_runner(scenario.test_runner_path)
-        test_runner = test_runner_cls(scenario)
-        test_runner.run()
+    print("  pass rate %.2f, %d%% CI [%.2f, %.2f], iteration time p50 %.3fs, p95 %.3fs" % (
+        summary["pass_rate"],
+        round(summary["confidence"] * 100),
+        summary["ci_low"],
+        summary["ci_high"],
+        summary["p50_sec"],
+        summary["p95_sec"],
+    ))
+    if summary["limiter_wait_sec"]:
+        print("  waited %.3fs on the LLM rate limiter" % summary["limiter_wait_sec"])
+    if summary["target_pass_rate"] is not None:
+        stopped = " (stopped early)" if summary["total"] < scenario.iterations else ""
+        print("  target pass rate %.2f: %s after %d/%d iterations%s" % (
+            summary["target_pass_rate"],
+            summary["decision"],
+            summary["total"],
+            scenario.iterations,
+            stopped,
+        ))
 
 
 if __name__ == "__main__":
-    app()
\ No newline at end of file
+    app()
@@ -1,10 +1,16 @@
 from typing import Optional
 
 class MycConfig:
-    iterraions: Optional[int] = 1
+    iterations: Optional[int] = 1
+    concurrency: Optional[int] = 1
+    confidence: Optional[float] = 0.95
     timeout_sec: Optional[int] = 60
     wait_for_agents: Optional[bool] = False
-    default_test_runner_path: Optional[str]
+    default_test_runner_path: Optional[str] = None
     root_dir: Optional[str]
     # scenarios_configs_patterns: Optional[list[str]] = ["!/**/venv/*.myc-scenario.yml"]
-    scenarios_configs_patterns: Optional[list[str]] = [r'^(?!.*\/venv\/).*\.myc-scenario\.yml$']
\ No newline at end of file
+    scenarios_configs_patterns: Optional[list[str]] = [r'^(?!.*\/venv\/).*\.myc-scenario\.yml$']
+    # matched against directory paths relative to root_dir, matching directories are not walked
+    scenarios_exclude_dirs_patterns: Optional[list[str]] = [r'(^|/)(venv|\.venv|\.git|node_modules|__pycache__|\.myctest)$']
+    cache_dir: Optional[str] = ".myctest"
+    llm_cache_max_bytes: Optional[int] = 512 * 1024 * 1024
\ No newline at end of file
@@ -0,0 +1,29 @@
+import contextvars
+from contextlib import contextmanager
+
+# What is running in the current thread or asyncio task. Set by the runner and the agent layer and
+# read by tracing and logging, so ids do not have to be passed through every call.
+# Note that threading.Thread does not inherit context: threads started inside an iteration should be
+# started with contextvars.copy_context().run to keep it.
+current_iteration = contextvars.ContextVar("myctest_current_iteration", default=None)
+current_agent = contextvars.ContextVar("myctest_current_agent", default=None)
+
+@contextmanager
+def iteration_context(iteration):
+    token = current_iteration.set(iteration)
+    try:
+        yield iteration
+    finally:
+        current_iteration.reset(token)
+
+@contextmanager
+def agent_context(agent_id: str):
+    token = current_agent.set(agent_id)
+    try:
+        yield agent_id
+    finally:
+        current_agent.reset(token)
+
+def get_iteration_index():
+    iteration = current_iteration.get()
+    return iteration.index if iteration is not None else None
@@ -0,0 +1,156 @@
+import threading
+from collections import deque
+from typing import Optional, Callable
+from myctest.replay import to_plain
+
+# Conversation history of one agent, kept within a token budget.
+#
+# Messages are slotted objects holding the dict sent to the model, built once. Token totals and the
+# pending / unlogged counters are updated as messages come and go, so checking for work, logging and
+# building a request never rescan the history. When a request would exceed max_tokens, the
+# conversation's policy drops or summarizes the oldest messages; the system prompt is always kept.
+
+def estimate_tokens(text: Optional[str]) -> int:
+    # ~4 characters per token, plus a few tokens of per-message overhead
+    return (len(text) if text else 0) // 4 + 4
+
+class Message:
+    __slots__ = ("role", "content", "data", "tokens", "sequence")
+
+    def __init__(self, role: str, content: Optional[str], data: dict, tokens: int, sequence: int):
+        self.role = role
+        self.content = content
+        # the message as sent to the model
+        self.data = data
+        self.tokens = tokens
+        self.sequence = sequence
+
+    @property
+    def tool_calls(self) -> Optional[list]:
+        return self.data.get("tool_calls")
+
+    def __repr__(self):
+        return "Message(%s, %r)" % (self.role, self.content)
+
+class TruncateOldest:
+    # drops the oldest messages; a tool call and its results are dropped together, because a tool
+    # result without the assistant message that requested it is rejected by the API
+    def compact(self, conversation: "Conversation", budget: int):
+        messages = conversation.messages
+        while messages and conversation.tokens > budget and len(messages) > 1:
+            conversation.evict()
+            while messages and messages[0].role == "tool":
+                conversation.evict()
+
+class Summarize:
+    # replaces the oldest messages with a summary, produced by summarizer(messages, previous_summary),
+    # e.g. a completion asking the model to summarize; keep_ratio of the budget stays verbatim
+    def __init__(self, summarizer: Callable[[list, Optional[str]], str], keep_ratio: float = 0.5):
+        self.summarizer = summarizer
+        self.keep_ratio = keep_ratio
+
+    def compact(self, conversation: "Conversation", budget: int):
+        messages = conversation.messages
+        evicted = []
+        while messages and conversation.tokens > budget * self.keep_ratio and len(messages) > 1:
+            evicted.append(conversation.evict())
+            while messages and messages[0].role == "tool":
+                evicted.append(conversation.evict())
+
+        if evicted:
+            previous = conversation.summary.content if conversation.summary is not None else None
+            conversation.set_summary(self.summarizer([message.data for message in evicted], previous))
+
+        # the summary itself may not fit
+        TruncateOldest().compact(conversation, budget)
+
+class Conversation:
+    def __init__(self, system_prompt: Optional[str] = None, max_tokens: Optional[int] = None, policy = None, count_tokens = estimate_tokens):
+        self.max_tokens = max_tokens
+        self.policy = policy or TruncateOldest()
+        self.count_tokens = count_tokens
+        self.lock = threading.RLock()
+        self.messages = deque()
+        self.system = None
+        self.summary = None
+        self.tokens = 0
+        self.sequence = 0
+        # user and tool messages added since the last request
+        self.pending = 0
+        # sequence number of the first message not logged yet
+        self.logged = 0
+        self.evicted = 0
+        if system_prompt is not None:
+            self.system = self._message({"role": "system", "content": system_prompt})
+            self.tokens += self.system.tokens
+
+    def __len__(self):
+        return len(self.messages)
+
+    def _message(self, data: dict) -> Message:
+        content = data.get("content")
+        tokens = self.count_tokens(content if isinstance(content, str) else None)
+        for tool_call in data.get("tool_calls") or []:
+            tokens += self.count_tokens(tool_call.get("function", {}).get("arguments"))
+        message = Message(data["role"], content, data, tokens, self.sequence)
+        self.sequence += 1
+        return message
+
+    def add(self, role: str, content: Optional[str], **fields) -> Message:
+        data = {"role": role, "content": content}
+        data.update((key, value) for key, value in fields.items() if value is not None)
+        return self.add_data(data)
+
+    def add_data(self, data: dict) -> Message:
+        with self.lock:
+            message = self._message(data)
+            self.messages.append(message)
+            self.tokens += message.tokens
+            if message.role != "assistant":
+                self.pending += 1
+            return message
+
+    def add_completion(self, completion_message) -> Message:
+        # the message of a completion choice, as returned by the client
+        data = to_plain(completion_message)
+        data.setdefault("content", None)
+        return self.add_data(data)
+
+    def add_tool_result(self, tool_call_id: str, name: str, content: str) -> Message:
+        return self.add("tool", content, tool_call_id=tool_call_id, name=name)
+
+    def set_summary(self, summary: Optional[str]):
+        with self.lock:
+            if self.summary is not None:
+                self.tokens -= self.summary.tokens
+            self.summary = None
+            if summary:
+                self.summary = self._message({"role": "system", "content": "Summary of the earlier conversation:\n" + summary})
+                self.tokens += self.summary.tokens
+
+    def evict(self) -> Message:
+        message = self.messages.popleft()
+        self.tokens -= message.tokens
+        self.evicted += 1
+        return message
+
+    def request_messages(self) -> list[dict]:
+        # messages for the next completion, within max_tokens; marks all pending messages as processed
+        with self.lock:
+            if self.max_tokens is not None and self.tokens > self.max_tokens:
+                self.policy.compact(self, self.max_tokens)
+            self.pending = 0
+            head = [message.data for message in (self.system, self.summary) if message is not None]
+            return head + [message.data for message in self.messages]
+
+    def unlogged(self) -> list[Message]:
+        # messages added since the last call, only walks the new ones (evicted ones are skipped)
+        with self.lock:
+            new = []
+            for message in reversed(self.messages):
+                if message.sequence < self.logged:
+                    break
+                new.append(message)
+            self.logged = self.sequence
+            new.reverse()
+            return new
@@ -0,0 +1,87 @@
+import os
+import re
+import json
+import time
+
+class DiscoveryIndex:
+    version = 1
+
+    def __init__(self, path: str = None):
+        self.path = path
+        # directory -> [mtime_ns, files, dirs]
+        self.entries = {}
+        self.visited = set()
+        self.changed = False
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r") as stream:
+                index = json.load(stream)
+        except (OSError, ValueError):
+            return
+
+        if index.get("version") == self.version:
+            self.entries = index.get("entries", {})
+
+    def save(self):
+        if not self.path:
+            return
+
+        # directories that disappeared or are now excluded are dropped from the index
+        stale = self.entries.keys() - self.visited
+        if not self.changed and not stale:
+            return
+
+        entries = {directory: entry for directory, entry in self.entries.items() if directory in self.visited}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp_path, "w") as stream:
+            json.dump({"version": self.version, "entries": entries}, stream)
+        os.replace(tmp_path, self.path)
+
+    def listdir(self, directory: str):
+        self.visited.add(directory)
+        mtime_ns = os.stat(directory).st_mtime_ns
+        entry = self.entries.get(directory)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1], entry[2]
+
+        files, dirs = [], []
+        with os.scandir(directory) as entries:
+            for dir_entry in entries:
+                if dir_entry.is_dir(follow_symlinks=False):
+                    dirs.append(dir_entry.name)
+                else:
+                    files.append(dir_entry.name)
+        files.sort()
+        dirs.sort()
+
+        # a directory modified within the mtime resolution window could change again
+        # without its mtime changing, so it is not trusted until the next run
+        if time.time_ns() - mtime_ns > 1_000_000_000:
+            self.entries[directory] = [mtime_ns, files, dirs]
+            self.changed = True
+        else:
+            self.entries.pop(directory, None)
+
+        return files, dirs
+
+def walk(directory: str, exclude_patterns: list[re.Pattern], index: DiscoveryIndex):
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            files, dirs = index.listdir(current)
+        except OSError:
+            continue
+
+        yield current, files
+
+        for name in reversed(dirs):
+            path = os.path.join(current, name)
+            relpath = os.path.relpath(path, directory).replace(os.sep, "/")
+            if any(pattern.search(relpath) for pattern in exclude_patterns):
+                continue
+            stack.append(path)
@@ -0,0 +1,323 @@
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import inspect
+import threading
+import traceback
+from collections import deque, defaultdict
+from typing import Optional
+from myctest.config import MycConfig
+from myctest.scenario import Scenario, get_scenario
+from myctest.executor import ScenarioResult, TRACE_DIR_ENV, ACTION_LOG_DIR_ENV, get_output_name, write_trace
+from myctest.stats import SequentialTest
+from myctest import tracing
+
+# Coordinator / worker execution over TCP, one JSON object per line.
+#
+#   worker -> coordinator   {"type": "hello", "worker": id}
+#                           {"type": "result", "unit": [relpath, index], "iteration": {...}}
+#                           {"type": "error", "unit": [relpath, index], "error": traceback}
+#                           {"type": "heartbeat"}
+#   coordinator -> worker   {"type": "unit", "unit": [relpath, index]}
+#                           {"type": "shutdown"}
+#
+# A work unit is one iteration of one scenario, scenarios are addressed by their path relative to the
+# root directory, so workers on other hosts need the same checkout. Workers run one unit at a time and
+# keep one runner per scenario (before() runs once per worker, after() at shutdown). A worker that
+# disconnects or stops sending heartbeats is dropped and its unit is handed to another worker.
+#
+# --trace and --action-log are applied by every worker: one trace per worker, one action log per
+# scenario and worker (<scenario>@<worker id>), since several workers run iterations of a scenario.
+
+def send_message(stream, message: dict):
+    stream.write(json.dumps(message).encode() + b"\n")
+
+class Coordinator:
+    def __init__(
+        self,
+        config: MycConfig,
+        scenarios: list,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        heartbeat_timeout_sec: float = 10.0,
+        max_attempts: int = 3,
+        on_worker_lost = None,
+    ):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout_sec = heartbeat_timeout_sec
+        self.max_attempts = max_attempts
+        # called with the worker id while work remains, e.g. to start a replacement
+        self.on_worker_lost = on_worker_lost
+
+        self.results = {}
+        self.sequential_tests = {}
+        for index, (path, scenario) in enumerate(scenarios):
+            relpath = os.path.relpath(path, config.root_dir)
+            self.results[relpath] = ScenarioResult(index, path, scenario)
+            self.results[relpath].iterations = []
+            if scenario.target_pass_rate is not None:
+                self.sequential_tests[relpath] = SequentialTest(scenario.target_pass_rate, scenario.confidence or 0.95)
+
+        # iteration i of every scenario before iteration i + 1 of any, so all scenarios make progress
+        max_iterations = max((scenario.iterations for _, scenario in scenarios), default=0)
+        self.queue = deque(
+            (relpath, index)
+            for index in range(max_iterations)
+            for relpath, result in self.results.items()
+            if index < result.scenario.iterations
+        )
+        self.in_flight = {}
+        self.attempts = defaultdict(int)
+        self.workers = {}
+        self.idle = []
+        self.handlers = set()
+        self.done = None
+
+    def run(self, on_listening = None) -> list[ScenarioResult]:
+        return asyncio.run(self.serve(on_listening))
+
+    async def serve(self, on_listening = None) -> list[ScenarioResult]:
+        self.done = asyncio.Event()
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        if on_listening:
+            on_listening(self.port)
+
+        async with server:
+            self.check_done()
+            await self.done.wait()
+            for writer in list(self.workers.values()):
+                try:
+                    send_message(writer, {"type": "shutdown"})
+                    await writer.drain()
+                except ConnectionError:
+                    pass
+            # workers run their after() hooks and disconnect
+            if self.handlers:
+                await asyncio.wait(list(self.handlers), timeout=self.heartbeat_timeout_sec)
+            for handler in list(self.handlers):
+                handler.cancel()
+
+        return sorted(self.results.values(), key=lambda result: result.index)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker_id = None
+        self.handlers.add(asyncio.current_task())
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.heartbeat_timeout_sec)
+                if not line:
+                    break
+                message = json.loads(line)
+                if message["type"] == "hello":
+                    worker_id = message["worker"]
+                    self.workers[worker_id] = writer
+                elif message["type"] == "result":
+                    self.complete(worker_id, message)
+                elif message["type"] == "error":
+                    self.fail(worker_id, message)
+                else:
+                    # heartbeats only keep the connection alive
+                    continue
+                await self.dispatch(worker_id)
+        except (asyncio.TimeoutError, asyncio.CancelledError, ConnectionError, ValueError, KeyError):
+            pass
+        finally:
+            self.handlers.discard(asyncio.current_task())
+            writer.close()
+            if worker_id is not None:
+                await self.lost(worker_id)
+
+    async def dispatch(self, worker_id: str):
+        writer = self.workers.get(worker_id)
+        if writer is None or worker_id in self.in_flight:
+            return
+
+        if not self.queue:
+            self.idle.append(worker_id)
+            self.check_done()
+            return
+
+        unit = self.queue.popleft()
+        self.in_flight[worker_id] = unit
+        self.attempts[unit] += 1
+        send_message(writer, {"type": "unit", "unit": list(unit)})
+        await writer.drain()
+
+    def complete(self, worker_id: str, message: dict):
+        from myctest.runner import Iteration
+
+        relpath, index = self.in_flight.pop(worker_id)
+        result = self.results[relpath]
+        iteration = Iteration.from_dict(message["iteration"])
+        # workers' clocks may disagree, early stopping looked at results in the order they arrived here
+        iteration.completed_at = time.time()
+        result.iterations.append(iteration)
+        result.iterations.sort(key=lambda iteration: iteration.index)
+
+        sequential_test = self.sequential_tests.get(relpath)
+        if sequential_test is not None and not sequential_test.decided:
+            sequential_test.add(iteration.passed)
+            if sequential_test.decided:
+                # iterations that were not handed out yet are not run
+                self.drop_queued(relpath)
+
+    def fail(self, worker_id: str, message: dict):
+        relpath, _ = self.in_flight.pop(worker_id)
+        self.crash(relpath, message.get("error") or "Scenario failed on worker %s" % worker_id)
+
+    def crash(self, relpath: str, error: str):
+        # like a runner raising in a single process run: the whole scenario is reported as crashed
+        if self.results[relpath].error is None:
+            self.results[relpath].error = error
+        self.drop_queued(relpath)
+
+    def drop_queued(self, relpath: str):
+        self.queue = deque(unit for unit in self.queue if unit[0] != relpath)
+
+    async def lost(self, worker_id: str):
+        self.workers.pop(worker_id, None)
+        if worker_id in self.idle:
+            self.idle.remove(worker_id)
+
+        unit = self.in_flight.pop(worker_id, None)
+        if unit is not None:
+            if self.attempts[unit] >= self.max_attempts:
+                self.crash(unit[0], "Worker lost while running iteration %d, %d attempts" % (unit[1], self.attempts[unit]))
+            else:
+                self.queue.appendleft(unit)
+                while self.idle and self.queue:
+                    await self.dispatch(self.idle.pop())
+
+        self.check_done()
+        if self.on_worker_lost and not self.done.is_set():
+            self.on_worker_lost(worker_id)
+
+    def check_done(self):
+        if not self.queue and not self.in_flight:
+            self.done.set()
+
+class Worker:
+    def __init__(self, config: MycConfig, host: str, port: int, worker_id: Optional[str] = None, heartbeat_interval_sec: float = 1.0):
+        self.config = config
+        self.host = host
+        self.port = port
+        self.worker_id = worker_id or "%s:%d" % (socket.gethostname(), os.getpid())
+        self.heartbeat_interval_sec = heartbeat_interval_sec
+        self.runners = {}
+        self.action_logs = {}
+        self.iterations = defaultdict(list)
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.loop = None
+        self.connection = None
+        self.stream = None
+        self.tracer = None
+
+    @property
+    def output_name(self) -> str:
+        return re.sub(r"[^\w.-]", "-", self.worker_id)
+
+    def send(self, message: dict):
+        with self.lock:
+            send_message(self.stream, message)
+            self.stream.flush()
+
+    def heartbeat(self):
+        while not self.stopped.wait(self.heartbeat_interval_sec):
+            try:
+                self.send({"type": "heartbeat"})
+            except (OSError, ValueError):
+                return
+
+    def run(self):
+        if os.getenv(TRACE_DIR_ENV):
+            self.tracer = tracing.enable_tracing()
+        with socket.create_connection((self.host, self.port)) as connection:
+            self.connection = connection
+            self.stream = connection.makefile("rwb")
+            threading.Thread(target=self.heartbeat, daemon=True).start()
+            try:
+                self.send({"type": "hello", "worker": self.worker_id})
+                for line in self.stream:
+                    message = json.loads(line)
+                    if message["type"] == "shutdown":
+                        break
+                    if message["type"] == "unit":
+                        self.send(self.run_unit(*message["unit"]))
+            finally:
+                self.stopped.set()
+                self.finish()
+                # the socket is only closed once the stream on it is, until then the coordinator waits
+                with self.lock:
+                    self.stream.close()
+
+    def run_unit(self, relpath: str, index: int) -> dict:
+        try:
+            runner = self.get_runner(relpath)
+            iteration = self.call(runner.iteration(index))
+            self.iterations[relpath].append(iteration)
+            print("%s iteration %d: %s" % (relpath, index, iteration))
+            return {"type": "result", "unit": [relpath, index], "iteration": iteration.to_dict()}
+        except Exception:
+            return {"type": "error", "unit": [relpath, index], "error": traceback.format_exc()}
+
+    def get_runner(self, relpath: str):
+        from myctest.runner import import_test_runner
+
+        if relpath not in self.runners:
+            scenario_path = os.path.join(self.config.root_dir, relpath)
+            scenario: Scenario = get_scenario(self.config, scenario_path)
+            runner = import_test_runner(scenario.test_runner_path)(scenario)
+            action_log_dir = os.getenv(ACTION_LOG_DIR_ENV)
+            if action_log_dir:
+                from myctest.action_log import ActionLogWriter
+
+                name = "%s@%s" % (get_output_name(scenario_path, self.config.root_dir), self.output_name)
+                runner.action_log = self.action_logs[relpath] = ActionLogWriter(os.path.join(action_log_dir, name))
+            self.call(runner.before(scenario, runner.environment))
+            # every iteration starts from the state as it was right after before(), as in BaseTestRunner.run
+            runner.pristine_state = runner.environment.state.snapshot()
+            self.runners[relpath] = runner
+        return self.runners[relpath]
+
+    def call(self, result):
+        # async runners share one event loop per worker, so agents can outlive a single unit
+        if not inspect.isawaitable(result):
+            return result
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop.run_until_complete(result)
+
+    def finish(self):
+        for relpath, runner in self.runners.items():
+            try:
+                self.call(runner.after(runner.scenario, runner.environment, self.iterations[relpath]))
+            except Exception:
+                traceback.print_exc()
+            runner.environment.close()
+        for action_log in self.action_logs.values():
+            action_log.close()
+        if self.loop is not None:
+            self.loop.close()
+        if self.tracer is not None:
+            tracing.disable_tracing()
+            write_trace(self.tracer, os.getenv(TRACE_DIR_ENV), "worker-%s" % self.output_name)
+
+def parse_address(address: str) -> tuple[str, int]:
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+def spawn_local_workers(count: int, port: int, root_dir: str) -> list:
+    import subprocess
+
+    return [
+        subprocess.Popen([sys.executable, "-m", "myctest.cli", "worker", "--connect", "127.0.0.1:%d" % port], cwd=root_dir)
+        for _ in range(count)
+    ]
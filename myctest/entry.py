@@ -0,0 +1,49 @@
+import os
+import sys
+from typing import Optional
+from myctest.config import MycConfig
+
+# The myc-test entry point. `myc-test list` is answered without importing typer, which is most of
+# the command's startup time; every other command line goes to the typer app in myctest.cli.
+
+def main():
+    select = parse_list_args(sys.argv[1:])
+    if select is None:
+        from myctest.cli import app
+        return app()
+    list_scenarios(get_config(), select)
+
+def parse_list_args(args: list[str]) -> Optional[list[str]]:
+    # the selection of `myc-test [-k VALUE]... list [-k VALUE]...`, None for any other command line
+    selects = ([], [])
+    command = None
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("-k", "--select") and index + 1 < len(args):
+            selects[command is not None].append(args[index + 1])
+            index += 2
+        elif arg.startswith("--select="):
+            selects[command is not None].append(arg[len("--select="):])
+            index += 1
+        elif arg == "list" and command is None:
+            command = arg
+            index += 1
+        else:
+            return None
+    if command is None:
+        return None
+    # like the typer app, a selection before the command wins over one after it
+    return selects[0] or selects[1]
+
+def list_scenarios(config: MycConfig, select: Optional[list[str]]):
+    from myctest.scenario import get_selected_scenarios_paths, peek_scenario_name
+
+    for scenario_path in get_selected_scenarios_paths(config, select or None):
+        name = peek_scenario_name(scenario_path)
+        print("./%s%s" % (os.path.relpath(scenario_path, config.root_dir), " (%s)" % name if name else ""))
+
+def get_config() -> MycConfig:
+    config = MycConfig()
+    config.root_dir = os.getcwd()
+    return config
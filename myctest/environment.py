@@ -1,34 +1,132 @@
-from myctest.observable import Observable    
+import weakref
+from myctest.observable import Observable
+from myctest.bus import MESSAGE_EVENTS
+from myctest import tracing
 from myctest.scenario import EnvironmentConfig
+from myctest.state import PersistentMap, MISSING, freeze, thaw
+from myctest.validation import CompiledStateSchema, StateValidator
+
+# default_state frozen once per scenario config instead of once per environment
+_default_states = weakref.WeakKeyDictionary()
+
+def get_default_state(environment_config: EnvironmentConfig) -> PersistentMap:
+    default_state = _default_states.get(environment_config)
+    if default_state is None:
+        default_state = _default_states[environment_config] = freeze(environment_config.default_state or {})
+    return default_state
+
+# desired_state_schema compiled once per scenario config
+_compiled_schemas = weakref.WeakKeyDictionary()
+
+def get_compiled_schema(environment_config: EnvironmentConfig) -> CompiledStateSchema:
+    compiled_schema = _compiled_schemas.get(environment_config)
+    if compiled_schema is None:
+        compiled_schema = _compiled_schemas[environment_config] = CompiledStateSchema(environment_config.desired_state_schema)
+    return compiled_schema
 
 class EnvironmentState:
-    def __init__(self, default_state = {}):
-        self.state = default_state
+    # State is a persistent map: snapshot() and restore() are O(1) and values are frozen
+    # (dicts become read-only PersistentMaps, lists become tuples), so nothing leaks between
+    # snapshots. Nested values are updated with set_in() rather than mutated in place.
+    def __init__(self, default_state = None, on_change = None):
+        self.state = freeze(default_state or {})
+        self.baseline = self.state
+        self.on_change = on_change
 
     def set(self, key, value):
-        self.state[key] = value
+        self.state = self.state.set(key, freeze(value))
+        if self.on_change:
+            self.on_change(key, value, (key,))
+
+    def set_in(self, path, value):
+        if not path:
+            raise Exception("State path must not be empty")
+
+        key = path[0]
+        self.state = self.state.set(key, self._set_in(self.state.get(key), path[1:], freeze(value)))
+        if self.on_change:
+            self.on_change(key, self.state[key], tuple(path))
+
+    def _set_in(self, node, path, value):
+        if not path:
+            return value
+        if node is None:
+            node = PersistentMap()
+        if not isinstance(node, PersistentMap):
+            raise Exception("Cannot set %s on a non-mapping state value" % (path,))
+        return node.set(path[0], self._set_in(node.get(path[0]), path[1:], value))
 
     def get(self, key):
         return self.state[key]
-  
+
+    def get_in(self, path, default = None):
+        node = self.state
+        for key in path:
+            if not isinstance(node, PersistentMap) or key not in node:
+                return default
+            node = node[key]
+        return node
+
+    def delete(self, key):
+        self.state = self.state.delete(key)
+        if self.on_change:
+            self.on_change(key, MISSING, (key,))
+
+    def snapshot(self) -> PersistentMap:
+        return self.state
+
+    def restore(self, snapshot: PersistentMap):
+        # the restored snapshot becomes the baseline for changes()
+        changes = self.state.diff(snapshot) if self.on_change else {}
+        self.state = snapshot
+        self.baseline = snapshot
+        for key, (_, value) in changes.items():
+            self.on_change(key, value, (key,))
+
+    def diff(self, snapshot_a: PersistentMap, snapshot_b: PersistentMap = None) -> dict:
+        return snapshot_a.diff(self.state if snapshot_b is None else snapshot_b)
+
+    def changes(self) -> dict:
+        return self.baseline.diff(self.state)
+
+    def to_dict(self) -> dict:
+        return thaw(self.state)
+
 
 class Environment(Observable):
     def __init__(self, environment_config: EnvironmentConfig):
-        super().__init__(["action.executed"])
+        super().__init__(["action.executed", "state.changed", *MESSAGE_EVENTS])
+        self.environment_config = environment_config
         self.actions = {}
-        self.state = EnvironmentState(environment_config.default_state)
+        self.state_validator = StateValidator(get_compiled_schema(environment_config))
+        self.state = EnvironmentState(get_default_state(environment_config), self.on_state_changed)
         self.desired_state_schema = environment_config.desired_state_schema
 
     def register_action(self, action, cb):
         self.actions[action] = cb
 
+    def fork(self):
+        # same registered actions, state starting from the current state (shared, not copied), no subscribers
+        environment = self.__class__(self.environment_config)
+        environment.actions = dict(self.actions)
+        environment.state.restore(self.state.snapshot())
+        return environment
+
+    def on_state_changed(self, key, value, path):
+        self.state_validator.invalidate(path)
+        self.emit("state.changed", key, value, path)
+
     def execute_action(self, action, *attrs):
         if action not in self.actions:
             raise Exception("Action %s not supported" % action)
-        
-        self.actions[action](self, *attrs)
+
+        with tracing.span("action:%s" % action, "action", action=action):
+            self.actions[action](self, *attrs)
         self.emit("action.executed", action, *attrs)
 
     def validate_state(self):
-        # TODO: validate state
-        return True
\ No newline at end of file
+        # only constraints under paths changed since the last call are re-checked
+        return self.state_validator.validate(lambda: self.state.state)
+
+    def unsatisfied_constraints(self) -> list[str]:
+        return [str(constraint) for constraint in self.state_validator.unsatisfied()]
@@ -0,0 +1,136 @@
+import os
+import json
+import asyncio
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from myctest.scenario import Scenario
+from myctest import tracing
+from myctest.stats import summarize_scenario, meets_target
+
+class ScenarioResult:
+    def __init__(self, index: int, scenario_path: str, scenario: Scenario):
+        self.index = index
+        self.scenario_path = scenario_path
+        self.scenario = scenario
+
+    iterations: Optional[list] = None
+    error: Optional[str] = None
+
+    @property
+    def summary(self) -> Optional[dict]:
+        if self.iterations is None:
+            return None
+        return summarize_scenario(self.scenario, self.iterations)
+
+    @property
+    def passed(self):
+        if self.error is not None:
+            return False
+        if self.scenario.target_pass_rate is not None:
+            return meets_target(self.summary)
+        return all(iteration.passed for iteration in self.iterations)
+
+# set by `myc-test --trace DIR` and `myc-test --action-log DIR`, inherited by worker processes
+TRACE_DIR_ENV = "MYCTEST_TRACE_DIR"
+ACTION_LOG_DIR_ENV = "MYCTEST_ACTION_LOG_DIR"
+
+def run_scenario(scenario_path: str, scenario: Scenario) -> list:
+    action_log = None
+    action_log_dir = os.getenv(ACTION_LOG_DIR_ENV)
+    if action_log_dir:
+        from myctest.action_log import ActionLogWriter
+        action_log = ActionLogWriter(os.path.join(action_log_dir, get_output_name(scenario_path)))
+
+    try:
+        trace_dir = os.getenv(TRACE_DIR_ENV)
+        if not trace_dir:
+            return _run_test_runner(scenario, action_log)
+
+        tracer = tracing.enable_tracing()
+        try:
+            return _run_test_runner(scenario, action_log)
+        finally:
+            tracing.disable_tracing()
+            export_trace(tracer, trace_dir, scenario_path)
+    finally:
+        if action_log is not None:
+            action_log.close()
+
+def _run_test_runner(scenario: Scenario, action_log=None) -> list:
+    # imported here so that every worker process builds its own runner and environment
+    from myctest.runner import import_test_runner, AsyncBaseTestRunner
+
+    test_runner_cls = import_test_runner(scenario.test_runner_path)
+    test_runner = test_runner_cls(scenario)
+    test_runner.action_log = action_log
+    if isinstance(test_runner, AsyncBaseTestRunner):
+        return asyncio.run(test_runner.run())
+    return test_runner.run()
+
+def export_trace(tracer: tracing.Tracer, trace_dir: str, scenario_path: str):
+    # <scenario path>.trace.json (Chrome trace / Perfetto), .folded (flame graph) and .summary.json
+    write_trace(tracer, trace_dir, get_output_name(scenario_path))
+
+def write_trace(tracer: tracing.Tracer, trace_dir: str, name: str):
+    os.makedirs(trace_dir, exist_ok=True)
+    tracer.export_chrome_trace(os.path.join(trace_dir, name + ".trace.json"))
+    tracer.export_folded_stacks(os.path.join(trace_dir, name + ".folded"))
+    with open(os.path.join(trace_dir, name + ".summary.json"), "w") as stream:
+        json.dump({"seconds_by_category": tracer.category_totals()}, stream, indent=2, sort_keys=True)
+
+def get_output_name(scenario_path: str, root_dir: Optional[str] = None) -> str:
+    # the scenario's path relative to the root directory (myc-test's working directory), flattened,
+    # so scenario files with the same name in different directories get their own traces and logs
+    relpath = os.path.relpath(os.path.abspath(scenario_path), root_dir or os.getcwd())
+    parts = [part for part in relpath.replace(os.altsep or os.sep, os.sep).split(os.sep) if part]
+    return "__".join(parts).rsplit(".yml", 1)[0]
+
+def _run_scenario_safe(scenario_path: str, scenario: Scenario):
+    try:
+        return run_scenario(scenario_path, scenario), None
+    except Exception:
+        return None, traceback.format_exc()
+
+def run_scenarios(scenarios: list, workers: int = 1, on_start=None, isolated: bool = False) -> list[ScenarioResult]:
+    # isolated: run in worker processes even with a single worker, so this process never imports runners
+    results = [ScenarioResult(index, path, scenario) for index, (path, scenario) in enumerate(scenarios)]
+
+    if workers <= 1 and not isolated:
+        for result in results:
+            if on_start:
+                on_start(result)
+            result.iterations, result.error = _run_scenario_safe(result.scenario_path, result.scenario)
+        return results
+
+    crashed = _run_in_pool(results, workers, on_start)
+
+    # A worker that died hard (segfault, os._exit, OOM kill) breaks the whole pool and every
+    # pending future with it. Re-run those scenarios one process each so that only the
+    # scenario that actually crashes is reported as crashed.
+    for result in crashed:
+        if _run_in_pool([result], 1, None):
+            result.error = "Worker process crashed while running scenario"
+
+    return results
+
+def _run_in_pool(results: list[ScenarioResult], workers: int, on_start) -> list[ScenarioResult]:
+    crashed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for result in results:
+            if on_start:
+                on_start(result)
+            futures[executor.submit(_run_scenario_safe, result.scenario_path, result.scenario)] = result
+
+        for future in as_completed(futures):
+            result = futures[future]
+            try:
+                result.iterations, result.error = future.result()
+            except BrokenProcessPool:
+                crashed.append(result)
+            except Exception:
+                result.error = traceback.format_exc()
+
+    return sorted(crashed, key=lambda result: result.index)
@@ -0,0 +1,176 @@
+import re
+import json
+import time
+import random
+import string
+import asyncio
+import itertools
+import threading
+from typing import Optional
+from myctest.replay import wrap, to_plain, Namespace
+from myctest.ratelimit import TokenBucket, RateLimitExceeded
+from myctest import tracing
+
+# Local stand-in for an OpenAI-style chat completions client, configured per agent from
+# agents[].metadata.mock_llm in the scenario YAML:
+#
+#   metadata:
+#     mock_llm:
+#       seed: 42
+#       latency: {distribution: lognormal, median_sec: 0.4, sigma: 0.5}
+#       rate_limit: {rpm: 600, burst: 20, on_limit: wait}   # on_limit: wait | error
+#       replies:
+#         - match: "change file"                            # regex on the last non-assistant message
+#           tool_calls:
+#             - name: send_message
+#               arguments: {agent_id: employee, message: "Please do: {last_message}"}
+#         - content: "Done, turn {turn}"                    # replies without match are used in order
+#
+# Templates can use {last_message}, {agent_id}, {model} and {turn}.
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "normal", "lognormal", "exponential")
+
+class _Template(string.Formatter):
+    def get_value(self, key, args, kwargs):
+        return kwargs.get(key, "{%s}" % key)
+
+_template = _Template()
+
+def render(value, variables: dict):
+    if isinstance(value, str):
+        return _template.format(value, **variables)
+    if isinstance(value, dict):
+        return {key: render(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [render(item, variables) for item in value]
+    return value
+
+class Latency:
+    def __init__(self, config: Optional[dict], rng: random.Random):
+        config = config or {"distribution": "constant", "value_sec": 0}
+        self.distribution = config.get("distribution", "constant")
+        if self.distribution not in LATENCY_DISTRIBUTIONS:
+            raise Exception("Latency distribution %s not supported" % self.distribution)
+        self.config = config
+        self.rng = rng
+
+    def sample(self) -> float:
+        config = self.config
+        if self.distribution == "constant":
+            value = config.get("value_sec", 0)
+        elif self.distribution == "uniform":
+            value = self.rng.uniform(config.get("min_sec", 0), config["max_sec"])
+        elif self.distribution == "normal":
+            value = self.rng.gauss(config["mean_sec"], config.get("stddev_sec", 0))
+        elif self.distribution == "lognormal":
+            value = config["median_sec"] * self.rng.lognormvariate(0, config.get("sigma", 0.5))
+        else:
+            value = self.rng.expovariate(1 / config["mean_sec"])
+        return max(0.0, value)
+
+class Reply:
+    def __init__(self, config: dict):
+        self.match = re.compile(config["match"]) if config.get("match") else None
+        self.content = config.get("content")
+        self.tool_calls = config.get("tool_calls") or []
+
+class MockLLMClient:
+    def __init__(
+        self,
+        replies: Optional[list[dict]] = None,
+        latency: Optional[dict] = None,
+        rate_limit: Optional[dict] = None,
+        seed: Optional[int] = None,
+        agent_id: Optional[str] = None,
+    ):
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.latency = Latency(latency, self.rng)
+        self.replies = [Reply(reply) for reply in replies or [{"content": "OK"}]]
+        self.fallback_replies = [reply for reply in self.replies if reply.match is None]
+        self.agent_id = agent_id
+        self.turns = itertools.count()
+        self.bucket = None
+        self.on_limit = "wait"
+        if rate_limit:
+            self.bucket = TokenBucket.per_minute(rate_limit["rpm"], rate_limit.get("burst"))
+            self.on_limit = rate_limit.get("on_limit", "wait")
+        self.chat = Namespace(completions=Namespace(create=self.create, acreate=self.acreate))
+
+    @classmethod
+    def from_metadata(cls, metadata: Optional[dict], agent_id: Optional[str] = None) -> "MockLLMClient":
+        config = (metadata or {}).get("mock_llm") or {}
+        return cls(
+            replies=config.get("replies"),
+            latency=config.get("latency"),
+            rate_limit=config.get("rate_limit"),
+            seed=config.get("seed"),
+            agent_id=agent_id,
+        )
+
+    def create(self, **request):
+        with tracing.span("llm.completion", "llm", model=request.get("model"), backend="mock"):
+            wait_sec = self._rate_limit()
+            if wait_sec:
+                time.sleep(wait_sec)
+            completion, latency_sec = self._complete(request)
+            time.sleep(latency_sec)
+            return completion
+
+    async def acreate(self, **request):
+        with tracing.span("llm.completion", "llm", model=request.get("model"), backend="mock"):
+            wait_sec = self._rate_limit()
+            if wait_sec:
+                await asyncio.sleep(wait_sec)
+            completion, latency_sec = self._complete(request)
+            await asyncio.sleep(latency_sec)
+            return completion
+
+    def _rate_limit(self) -> float:
+        if self.bucket is None:
+            return 0.0
+        if self.on_limit == "error":
+            wait_sec = self.bucket.try_acquire()
+            if wait_sec:
+                raise RateLimitExceeded("Mock LLM rate limit exceeded, retry in %.3fs" % wait_sec)
+            return 0.0
+        return self.bucket.reserve()
+
+    def _complete(self, request: dict):
+        messages = to_plain(request.get("messages") or [])
+        turn = next(self.turns)
+        last_message = next((message.get("content") or "" for message in reversed(messages) if message.get("role") != "assistant"), "")
+        variables = {"last_message": last_message, "agent_id": self.agent_id, "model": request.get("model"), "turn": turn}
+
+        reply = next((reply for reply in self.replies if reply.match is not None and reply.match.search(last_message)), None)
+        if reply is None:
+            fallback_replies = self.fallback_replies or self.replies
+            reply = fallback_replies[turn % len(fallback_replies)]
+
+        message = {"role": "assistant", "content": render(reply.content, variables) if reply.content is not None else None}
+        if reply.tool_calls:
+            message["tool_calls"] = [
+                {
+                    "id": "call_%d_%d" % (turn, index),
+                    "type": "function",
+                    "function": {
+                        "name": tool_call["name"],
+                        "arguments": json.dumps(render(tool_call.get("arguments") or {}, variables)),
+                    },
+                }
+                for index, tool_call in enumerate(reply.tool_calls)
+            ]
+
+        prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 4
+        completion_tokens = len(str(message["content"] or "")) // 4 + 10 * len(reply.tool_calls)
+        completion = {
+            "id": "mock-%d" % turn,
+            "object": "chat.completion",
+            "model": request.get("model", "mock"),
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if reply.tool_calls else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+        with self.rng_lock:
+            latency_sec = self.latency.sample()
+        return wrap(completion), latency_sec
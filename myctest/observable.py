@@ -1,16 +1,187 @@
+import sys
+import time
+import fnmatch
+import threading
+import traceback
+from collections import deque
+
+SYNC = "sync"    # called inside emit()
+ASYNC = "async"  # called one event at a time on the dispatcher thread, off the emitting thread
+BATCH = "batch"  # called with a list of (event, attrs) on the dispatcher thread
+
+DELIVERY_MODES = (SYNC, ASYNC, BATCH)
+
 class Observable(object):
-    def __init__(self, events):
+    # Subscriptions are either exact event names, called with cb(*attrs), or patterns such as
+    # "action.*" or "*", called with cb(event, *attrs). Subscriber lists are resolved once per event
+    # name and cached until the subscriptions change, so emit() is a dict lookup plus the calls.
+    # The last history_size events are kept in a ring buffer for post-mortem inspection.
+    def __init__(self, events, history_size: int = 1024, batch_delay_sec: float = 0):
       self.callbacks = {}
+      self.patterns = []
+      self._subscriptions_lock = threading.Lock()
+      self._resolved = {}
+      self._dispatcher = None
+      self.batch_delay_sec = batch_delay_sec
+      self.history = deque(maxlen=history_size) if history_size else None
 
       for event in events:
           self.callbacks[event] = []
-  
-    def on(self, event, cb):
-        if event not in self.callbacks:
-            raise Exception("Event %s not supported" % event)
-        
-        self.callbacks[event].append(cb)
+
+    def on(self, event, cb, delivery = SYNC):
+        if delivery not in DELIVERY_MODES:
+            raise Exception("Delivery mode %s not supported" % delivery)
+
+        with self._subscriptions_lock:
+            if is_pattern(event):
+                if not any(fnmatch.fnmatchcase(name, event) for name in self.callbacks):
+                    raise Exception("Event pattern %s does not match any supported event" % event)
+                self.patterns.append((event, cb, delivery))
+            else:
+                if event not in self.callbacks:
+                    raise Exception("Event %s not supported" % event)
+                self.callbacks[event].append((cb, delivery))
+            self._resolved = {}
+
+    def off(self, event, cb):
+        with self._subscriptions_lock:
+            if is_pattern(event):
+                self.patterns = [pattern for pattern in self.patterns if pattern[0] != event or pattern[1] != cb]
+            else:
+                if event not in self.callbacks:
+                    raise Exception("Event %s not supported" % event)
+                self.callbacks[event] = [subscriber for subscriber in self.callbacks[event] if subscriber[0] != cb]
+            self._resolved = {}
+
+    def _resolve(self, event):
+        with self._subscriptions_lock:
+            if event not in self.callbacks:
+                raise Exception("Event %s not supported" % event)
+
+            sync, deferred = [], []
+            for cb, delivery in self.callbacks[event]:
+                if delivery == SYNC:
+                    sync.append(cb)
+                else:
+                    deferred.append((cb, delivery, False))
+            for pattern, cb, delivery in self.patterns:
+                if fnmatch.fnmatchcase(event, pattern):
+                    if delivery == SYNC:
+                        sync.append(lambda *attrs, cb=cb: cb(event, *attrs))
+                    else:
+                        deferred.append((cb, delivery, True))
+
+            resolved = (tuple(sync), tuple(deferred))
+            self._resolved[event] = resolved
+            return resolved
 
     def emit(self, event, *attrs):
-        for cb in self.callbacks[event]:
-            cb(**attrs)
\ No newline at end of file
+        if self.history is not None:
+            self.history.append((time.monotonic(), event, attrs))
+
+        sync, deferred = self._resolved.get(event) or self._resolve(event)
+        for cb in sync:
+            cb(*attrs)
+
+        if deferred:
+            if self._dispatcher is None:
+                with self._subscriptions_lock:
+                    if self._dispatcher is None:
+                        self._dispatcher = _Dispatcher(self.batch_delay_sec)
+            self._dispatcher.put(deferred, event, attrs)
+
+    def recent_events(self, limit: int = None, pattern: str = None) -> list:
+        # (monotonic timestamp, event, attrs), oldest first
+        events = list(self.history or ())
+        if pattern is not None:
+            events = [item for item in events if fnmatch.fnmatchcase(item[1], pattern)]
+        return events[-limit:] if limit else events
+
+    def flush(self, timeout_sec: float = None) -> bool:
+        # waits until every event emitted so far was delivered to async and batch subscribers
+        if self._dispatcher is None:
+            return True
+        return self._dispatcher.flush(timeout_sec)
+
+    def close(self, timeout_sec: float = None):
+        # delivers what was emitted so far and stops the dispatcher thread; a later async or batch
+        # event starts a new one
+        with self._subscriptions_lock:
+            dispatcher, self._dispatcher = self._dispatcher, None
+        if dispatcher is not None:
+            dispatcher.close(timeout_sec)
+
+def is_pattern(event: str) -> bool:
+    return any(char in event for char in "*?[")
+
+# queued by close(), the dispatcher returns once everything before it is delivered
+_STOP = object()
+
+class _Dispatcher:
+    # deque.append is atomic, so emitting threads enqueue without taking a lock and only set the
+    # wake-up event when the dispatcher went idle
+    def __init__(self, batch_delay_sec: float):
+        self.batch_delay_sec = batch_delay_sec
+        self.queue = deque()
+        self.wakeup = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="observable-dispatcher", daemon=True)
+        self.thread.start()
+
+    def put(self, subscribers, event, attrs):
+        self.queue.append((subscribers, event, attrs))
+        if not self.wakeup.is_set():
+            self.wakeup.set()
+
+    def run(self):
+        while True:
+            self.wakeup.wait()
+            if self.batch_delay_sec:
+                time.sleep(self.batch_delay_sec)
+            self.wakeup.clear()
+
+            items = []
+            while self.queue:
+                item = self.queue.popleft()
+                if item is _STOP:
+                    self.deliver(items)
+                    return
+                items.append(item)
+            self.deliver(items)
+
+    def deliver(self, items):
+        batches = {}
+        flushed = []
+        for item in items:
+            if isinstance(item, threading.Event):
+                flushed.append(item)
+                continue
+            subscribers, event, attrs = item
+            for cb, delivery, with_event in subscribers:
+                if delivery == BATCH:
+                    batches.setdefault(cb, []).append((event, attrs))
+                else:
+                    self.call(cb, *((event,) + attrs if with_event else attrs))
+
+        for cb, batch in batches.items():
+            self.call(cb, batch)
+        for done in flushed:
+            done.set()
+
+    def call(self, cb, *args):
+        # a failing subscriber must not stop delivery to the others
+        try:
+            cb(*args)
+        except Exception:
+            traceback.print_exc(file=sys.stderr)
+
+    def flush(self, timeout_sec: float = None) -> bool:
+        done = threading.Event()
+        self.queue.append(done)
+        self.wakeup.set()
+        return done.wait(timeout_sec)
+
+    def close(self, timeout_sec: float = None):
+        self.queue.append(_STOP)
+        self.wakeup.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join(timeout_sec)
@@ -0,0 +1,77 @@
+import time
+import asyncio
+import threading
+
+class RateLimitExceeded(Exception):
+    pass
+
+class TokenBucket:
+    # rate tokens per second, up to capacity tokens can be spent in a burst
+    def __init__(self, rate: float, capacity: float = None, clock = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, per_minute: float, burst: float = None, clock = time.monotonic):
+        return cls(per_minute / 60, burst, clock)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # A request larger than the capacity waits for a full bucket and is then charged in full, leaving
+    # the bucket in debt, so later requests wait until the whole request has been paid back.
+
+    def wait_time(self, tokens: float = 1) -> float:
+        # how long until the tokens are available, without taking them
+        with self.lock:
+            self._refill(self.clock())
+            needed = min(tokens, self.capacity)
+            return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, tokens: float = 1):
+        # unconditionally, the bucket may go into debt; a negative number of tokens gives them back
+        with self.lock:
+            self._refill(self.clock())
+            self.tokens -= tokens
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        # takes the tokens and returns 0, or returns how long to wait until they are available
+        with self.lock:
+            self._refill(self.clock())
+            needed = min(tokens, self.capacity)
+            if self.tokens >= needed:
+                self.tokens -= tokens
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def reserve(self, tokens: float = 1) -> float:
+        # takes the tokens right away, possibly going into debt, and returns how long the caller
+        # has to wait before using them; callers reserving later queue up behind earlier ones
+        with self.lock:
+            self._refill(self.clock())
+            self.tokens -= tokens
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self, tokens: float = 1) -> float:
+        # blocks until the tokens are taken, returns the time spent waiting
+        waited = 0.0
+        while True:
+            wait_sec = self.try_acquire(tokens)
+            if wait_sec == 0:
+                return waited
+            time.sleep(wait_sec)
+            waited += wait_sec
+
+    async def acquire_async(self, tokens: float = 1) -> float:
+        waited = 0.0
+        while True:
+            wait_sec = self.try_acquire(tokens)
+            if wait_sec == 0:
+                return waited
+            await asyncio.sleep(wait_sec)
+            waited += wait_sec
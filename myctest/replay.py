@@ -0,0 +1,220 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+OFF = "off"
+RECORD = "record"  # every completion is requested live and stored
+REPLAY = "replay"  # completions are served from the cache only, a miss is an error
+
+MODES = (OFF, RECORD, REPLAY)
+
+# set by `myc-test --record/--replay`, read in the processes that run the agents
+MODE_ENV = "MYCTEST_LLM_CACHE_MODE"
+DIR_ENV = "MYCTEST_LLM_CACHE_DIR"
+MAX_BYTES_ENV = "MYCTEST_LLM_CACHE_MAX_BYTES"
+
+# set by `myc-test --mock-llm`, wrap_client then returns a MockLLMClient configured from the agent's metadata
+BACKEND_ENV = "MYCTEST_LLM_BACKEND"
+MOCK = "mock"
+
+class CompletionNotCached(Exception):
+    pass
+
+class AttrDict(dict):
+    # replayed completions keep the attribute access of the client's response objects
+    # (completion.choices[0].message.tool_calls) while staying plain, re-sendable dicts
+    def __getattr__(self, name):
+        try:
+            return wrap(self[name])
+        except KeyError:
+            if name in ("tool_calls", "function_call", "content", "refusal"):
+                return None
+            raise AttributeError(name)
+
+def wrap(value):
+    if isinstance(value, dict) and not isinstance(value, AttrDict):
+        return AttrDict(value)
+    if isinstance(value, list):
+        return [wrap(item) for item in value]
+    return value
+
+def to_plain(value):
+    if hasattr(value, "model_dump"):
+        return to_plain(value.model_dump(exclude_none=True))
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items() if item is not None}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+def completion_key(**request) -> str:
+    canonical = json.dumps(to_plain(request), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+class CompletionCache:
+    # On-disk cache (one JSON file per completion) with an in-memory LRU in front of it. When the
+    # directory grows past max_bytes the least recently used files are evicted.
+    def __init__(self, directory: str, max_bytes: int = 512 * 1024 * 1024, memory_items: int = 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = None
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + ".json")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return self.memory[key]
+
+        path = self.path(key)
+        try:
+            with open(path, "r") as stream:
+                value = json.load(stream)
+        except (OSError, ValueError):
+            return None
+
+        # mtime is the LRU clock used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: dict):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        content = json.dumps(value, ensure_ascii=False)
+        tmp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp_path, "w") as stream:
+            stream.write(content)
+        os.replace(tmp_path, path)
+        self._remember(key, value)
+
+        with self.lock:
+            if self.size is None:
+                self.size = self._disk_usage()[0]
+            else:
+                self.size += len(content.encode())
+            if self.size > self.max_bytes:
+                self._evict()
+
+    def _remember(self, key: str, value: dict):
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.memory_items:
+                self.memory.popitem(last=False)
+
+    def _disk_usage(self):
+        size = 0
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                size += stat.st_size
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+        return size, files
+
+    def _evict(self):
+        # evict down to 90% so that eviction does not run again on the very next write
+        size, files = self._disk_usage()
+        target = self.max_bytes * 0.9
+        for _, file_size, path in sorted(files):
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            size -= file_size
+            self.memory.pop(os.path.basename(path)[:-len(".json")], None)
+        self.size = size
+
+class ReplayClient:
+    # Drop-in wrapper for an OpenAI-style client: replay_client.chat.completions.create(**request)
+    def __init__(self, client = None, cache: Optional[CompletionCache] = None, mode: str = RECORD):
+        if mode not in MODES:
+            raise Exception("LLM cache mode %s not supported" % mode)
+
+        self.client = client
+        self.cache = cache
+        self.mode = mode
+        self.chat = Namespace(completions=Namespace(create=self.create, acreate=self.acreate))
+
+    def create(self, **request):
+        if self.mode == OFF:
+            return self.client.chat.completions.create(**request)
+
+        key = completion_key(**request)
+        if self.mode == REPLAY:
+            completion = self.cache.get(key)
+            if completion is None:
+                raise CompletionNotCached("Completion %s is not in the cache, run with --record first" % key)
+            return wrap(completion)
+
+        completion = self.client.chat.completions.create(**request)
+        self.cache.set(key, to_plain(completion))
+        return completion
+
+    async def acreate(self, **request):
+        if self.mode == OFF:
+            return await acreate_completion(self.client, **request)
+
+        key = completion_key(**request)
+        if self.mode == REPLAY:
+            completion = self.cache.get(key)
+            if completion is None:
+                raise CompletionNotCached("Completion %s is not in the cache, run with --record first" % key)
+            return wrap(completion)
+
+        completion = await acreate_completion(self.client, **request)
+        self.cache.set(key, to_plain(completion))
+        return completion
+
+class Namespace:
+    # attribute access for the chat.completions path of the client wrappers
+    def __init__(self, **attrs):
+        self.__dict__.update(attrs)
+
+async def acreate_completion(client, **request):
+    # clients without an async path are called in a thread, off the event loop
+    completions = client.chat.completions
+    if hasattr(completions, "acreate"):
+        return await completions.acreate(**request)
+    return await asyncio.to_thread(completions.create, **request)
+
+def wrap_client(client, directory: Optional[str] = None, mode: Optional[str] = None, metadata: Optional[dict] = None, agent_id: Optional[str] = None):
+    # returns the client untouched unless record/replay or a rate limit is enabled (by argument or by myc-test flags),
+    # replayed completions do not count against the rate limit; metadata and agent_id configure the mock backend
+    from myctest.scheduler import schedule_client
+
+    if os.getenv(BACKEND_ENV) == MOCK:
+        # mock completions are never recorded, and they still go through the rate limiter
+        from myctest.mock_llm import MockLLMClient
+        return schedule_client(MockLLMClient.from_metadata(metadata, agent_id))
+
+    client = schedule_client(client)
+    mode = mode or os.getenv(MODE_ENV, OFF)
+    if mode == OFF:
+        return client
+
+    directory = directory or os.getenv(DIR_ENV) or os.path.join(os.getcwd(), ".myctest", "llm-cache")
+    max_bytes = os.getenv(MAX_BYTES_ENV)
+    cache = CompletionCache(directory, int(max_bytes)) if max_bytes else CompletionCache(directory)
+    return ReplayClient(client, cache, mode)
@@ -1,7 +1,21 @@
+import os
+import sys
+import copy
+import hashlib
 import importlib.util as importutil
 from myctest.scenario import Scenario
 from myctest.environment import Environment
+from myctest.context import iteration_context, current_iteration
+from myctest.action_log import ActionLogWriter
+from myctest.stats import SequentialTest, summarize_scenario
+from myctest.testplan import TestPlan, get_test_plan
+from myctest import tracing
 import time
+import asyncio
+from typing import Optional
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from rich import print
 
 class Iteration:
@@ -12,63 +26,225 @@ class Iteration:
     timeout: bool = False
     time: float = 0.0
     done: bool = False
+    unsatisfied_constraints: list[str] = []
+    # time.time() by which the iteration times out, rate limited LLM calls of the most urgent iterations go first
+    deadline: Optional[float] = None
+    # time agents spent waiting on the LLM rate limiter, part of `time`
+    limiter_wait_time: float = 0.0
+    # time.time() when the iteration finished, the order in which early stopping looked at results
+    completed_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "index": self.index,
+            "passed": self.passed,
+            "timeout": self.timeout,
+            "time": self.time,
+            "done": self.done,
+            "unsatisfied_constraints": list(self.unsatisfied_constraints),
+            "deadline": self.deadline,
+            "limiter_wait_time": self.limiter_wait_time,
+            "completed_at": self.completed_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Iteration":
+        iteration = cls(data["index"])
+        for key, value in data.items():
+            if key != "index":
+                setattr(iteration, key, value)
+        return iteration
 
     def __str__(self):
-        return "passed=%s, timeout=%s, time=%f, done=%s" % (self.passed, self.timeout, self.time, self.done)
+        text = "passed=%s, timeout=%s, time=%f, done=%s" % (self.passed, self.timeout, self.time, self.done)
+        if self.limiter_wait_time:
+            text += ", limiter_wait_time=%f" % self.limiter_wait_time
+        return text
 
 class BaseTestRunner():
+    # environment events after which tests are re-evaluated
+    state_change_events = ["action.executed", "state.changed"]
+    # set for tests that depend on something the environment does not report (e.g. agents' own state)
+    poll_interval_sec: Optional[float] = None
+    pristine_state = None
+    # set by the executor when the run records an action log
+    action_log: Optional[ActionLogWriter] = None
+    # set when the scenario has a target_pass_rate, decides when to stop running iterations
+    sequential_test: Optional[SequentialTest] = None
+    # pass rate estimate, confidence interval and iteration times, set at the end of run()
+    summary: Optional[dict] = None
+    # deadline of every test* method, unless set with myctest.testplan.timeout; bounded by the iteration's
+    test_timeout_sec: Optional[float] = None
+
     def __init__(self, scenario: Scenario):
         self.wait_for_agents = scenario.wait_for_agents
         self.scenario = scenario
         self.environment = Environment(scenario.environment)
-    
+
     def run(self) -> list[Iteration]:
-        self.before(self.scenario, self.environment)
+        with tracing.span("before", scenario=self.scenario.name):
+            self.before(self.scenario, self.environment)
 
-        iterations = []
-        for i in range(self.scenario.iterations):
-            iteration = self.iteration(i)
-            iterations.append(iteration)
-            print("Iteration %d: %s" % (i, iteration))
+        # every iteration starts from the state as it was right after before()
+        self.pristine_state = self.environment.state.snapshot()
+        self.sequential_test = self.create_sequential_test()
+
+        concurrency = min(self.scenario.concurrency or 1, self.scenario.iterations)
+        if concurrency > 1:
+            iterations = self.run_concurrent_iterations(concurrency)
+        else:
+            iterations = []
+            for i in range(self.scenario.iterations):
+                iteration = self.iteration(i)
+                iterations.append(iteration)
+                print("Iteration %d: %s" % (i, iteration))
+                if self.should_stop(iteration):
+                    break
+
+        self.summary = summarize_scenario(self.scenario, iterations)
 
-        self.after(self.scenario, self.environment, iterations)
+        with tracing.span("after", scenario=self.scenario.name):
+            self.after(self.scenario, self.environment, iterations)
+        self.environment.close()
 
         return iterations
 
+    def run_concurrent_iterations(self, concurrency: int) -> list[Iteration]:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [executor.submit(self.isolated_iteration, i) for i in range(self.scenario.iterations)]
+
+            iterations = []
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                iteration = future.result()
+                iterations.append(iteration)
+                print("Iteration %d: %s" % (iteration.index, iteration))
+                if self.should_stop(iteration):
+                    # iterations that already started are finished and reported, the rest never start
+                    for pending in futures:
+                        pending.cancel()
+
+        return sorted(iterations, key=lambda iteration: iteration.index)
+
+    def create_sequential_test(self) -> Optional[SequentialTest]:
+        if self.scenario.target_pass_rate is None:
+            return None
+        return SequentialTest(self.scenario.target_pass_rate, self.scenario.confidence or 0.95)
+
+    def should_stop(self, iteration: Iteration) -> bool:
+        if self.sequential_test is None:
+            return False
+        if not self.sequential_test.decided:
+            self.sequential_test.add(iteration.passed)
+        return self.sequential_test.decided
+
+    def fork(self) -> "BaseTestRunner":
+        # a shallow copy bound to its own fork of the environment, so hooks, agents and any threads they
+        # start reach the iteration's environment through self.environment
+        runner = copy.copy(self)
+        runner.environment = self.environment.fork()
+        return runner
+
+    def isolated_iteration(self, index):
+        runner = self.fork()
+        environment = runner.environment
+        try:
+            return runner.iteration(index)
+        finally:
+            # stops the fork's dispatcher thread, if an async or batch subscriber started one
+            environment.close()
+
     def iteration(self, index):
-        timeout_sec = self.scenario.timeout_sec
         iteration = Iteration(index)
+        with iteration_context(iteration), tracing.span("iteration", scenario=self.scenario.name), self.logging_actions(iteration):
+            return self.run_iteration(iteration)
 
-        self.before_iteration(self.scenario, self.environment, iteration)
-        
-        start = time.time()
-        passed = False
-        while True:
-            elapsed = time.time() - start
-            timed_out = timeout_sec is not None and elapsed > timeout_sec
-            passed = self.run_tests()
-
-            if passed or timed_out:
-                iteration.done = True
-                iteration.passed = passed
-                iteration.timeout = timed_out
-                iteration.time = elapsed
-                break
-            
-            time.sleep(0.1)
-
-        self.after_iteration(self.scenario, self.environment, iteration)
+    @contextmanager
+    def logging_actions(self, iteration: Iteration):
+        if self.action_log is None:
+            yield
+            return
+
+        environment = self.environment
+        on_action_executed = self.action_log.subscriber(iteration.index)
+        environment.on("action.executed", on_action_executed)
+        try:
+            yield
+        finally:
+            environment.off("action.executed", on_action_executed)
+
+    def run_iteration(self, iteration: Iteration):
+        timeout_sec = self.scenario.timeout_sec
+
+        if timeout_sec is not None:
+            iteration.deadline = time.time() + timeout_sec
+
+        if self.pristine_state is not None:
+            self.environment.state.restore(self.pristine_state)
+
+        with tracing.span("before_iteration"):
+            self.before_iteration(self.scenario, self.environment, iteration)
+
+        # tests are re-evaluated only when the environment reports a change,
+        # the timeout is enforced by waiting at most until the deadline
+        environment = self.environment
+        changed = threading.Event()
+        on_change = lambda *_: changed.set()
+        for event in self.state_change_events:
+            environment.on(event, on_change)
+
+        start = time.perf_counter()
+        try:
+            while True:
+                changed.clear()
+                with tracing.span("run_tests"):
+                    passed = self.run_tests()
+                elapsed = time.perf_counter() - start
+                timed_out = not passed and timeout_sec is not None and elapsed >= timeout_sec
+
+                if passed or timed_out:
+                    iteration.done = True
+                    iteration.passed = passed
+                    iteration.timeout = timed_out
+                    iteration.time = elapsed
+                    iteration.completed_at = time.time()
+                    if not passed:
+                        iteration.unsatisfied_constraints = environment.unsatisfied_constraints()
+                    break
+
+                wait_sec = self.poll_interval_sec
+                if timeout_sec is not None:
+                    remaining = timeout_sec - elapsed
+                    wait_sec = remaining if wait_sec is None else min(wait_sec, remaining)
+                with tracing.span("wait_for_change"):
+                    changed.wait(wait_sec)
+        finally:
+            for event in self.state_change_events:
+                environment.off(event, on_change)
+
+        with tracing.span("after_iteration"):
+            self.after_iteration(self.scenario, self.environment, iteration)
 
         return iteration
 
     def run_tests(self):
-        passed = self.environment.validate_state()
-        for test in self.get_test_methods():
-            passed = test(self)
-        return passed
-    
-    def get_test_methods(cls):
-        return [getattr(cls, func) for func in dir(cls) if callable(getattr(cls, func)) and func.startswith('test')]
+        # passes when the state is valid and every test* method passes, stops at the first failure
+        if not self.environment.validate_state():
+            return False
+        return self.get_test_plan().run(self, self.get_deadline())
+
+    @classmethod
+    def get_test_plan(cls) -> TestPlan:
+        return get_test_plan(cls)
+
+    def get_test_methods(self):
+        # unbound, called with the runner, cheapest first
+        return [test.func for test in self.get_test_plan().tests]
+
+    def get_deadline(self) -> Optional[float]:
+        iteration = current_iteration.get()
+        return iteration.deadline if iteration is not None else None
 
     def before(self, _, __):
         pass
@@ -83,13 +259,179 @@ class BaseTestRunner():
         pass
 
 
+class AsyncBaseTestRunner(BaseTestRunner):
+    # Same lifecycle as BaseTestRunner, but run, iteration, run_tests and the hooks are coroutines,
+    # so agents implemented as asyncio tasks and many concurrent iterations share one event loop.
+    async def run(self) -> list[Iteration]:
+        with tracing.span("before", scenario=self.scenario.name):
+            await self.before(self.scenario, self.environment)
+
+        self.pristine_state = self.environment.state.snapshot()
+        self.sequential_test = self.create_sequential_test()
+
+        concurrency = min(self.scenario.concurrency or 1, self.scenario.iterations)
+        if concurrency > 1:
+            iterations = await self.run_concurrent_iterations(concurrency)
+        else:
+            iterations = []
+            for i in range(self.scenario.iterations):
+                iteration = await self.iteration(i)
+                iterations.append(iteration)
+                print("Iteration %d: %s" % (i, iteration))
+                if self.should_stop(iteration):
+                    break
+
+        self.summary = summarize_scenario(self.scenario, iterations)
+
+        with tracing.span("after", scenario=self.scenario.name):
+            await self.after(self.scenario, self.environment, iterations)
+        await asyncio.to_thread(self.environment.close)
+
+        return iterations
+
+    async def run_concurrent_iterations(self, concurrency: int) -> list[Iteration]:
+        semaphore = asyncio.Semaphore(concurrency)
+        iterations = []
+
+        async def run_iteration(index):
+            async with semaphore:
+                # once decided no new iteration starts, those already running finish and are reported
+                if self.sequential_test is not None and self.sequential_test.decided:
+                    return
+                iteration = await self.isolated_iteration(index)
+            iterations.append(iteration)
+            print("Iteration %d: %s" % (index, iteration))
+            self.should_stop(iteration)
+
+        await asyncio.gather(*(run_iteration(i) for i in range(self.scenario.iterations)))
+        return sorted(iterations, key=lambda iteration: iteration.index)
+
+    async def isolated_iteration(self, index):
+        runner = self.fork()
+        environment = runner.environment
+        try:
+            return await runner.iteration(index)
+        finally:
+            await asyncio.to_thread(environment.close)
+
+    async def iteration(self, index):
+        iteration = Iteration(index)
+        with iteration_context(iteration), tracing.span("iteration", scenario=self.scenario.name), self.logging_actions(iteration):
+            return await self.run_iteration(iteration)
+
+    async def run_iteration(self, iteration: Iteration):
+        timeout_sec = self.scenario.timeout_sec
+
+        if timeout_sec is not None:
+            iteration.deadline = time.time() + timeout_sec
+
+        if self.pristine_state is not None:
+            self.environment.state.restore(self.pristine_state)
+
+        with tracing.span("before_iteration"):
+            await self.before_iteration(self.scenario, self.environment, iteration)
+
+        environment = self.environment
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+
+        def on_change(*_):
+            # actions may also be executed from threads outside of the event loop
+            if threading.get_ident() == loop_thread_id:
+                changed.set()
+            else:
+                loop.call_soon_threadsafe(changed.set)
+
+        loop_thread_id = threading.get_ident()
+        for event in self.state_change_events:
+            environment.on(event, on_change)
+
+        start = time.perf_counter()
+        try:
+            while True:
+                changed.clear()
+                with tracing.span("run_tests"):
+                    passed = await self.run_tests()
+                elapsed = time.perf_counter() - start
+                timed_out = not passed and timeout_sec is not None and elapsed >= timeout_sec
+
+                if passed or timed_out:
+                    iteration.done = True
+                    iteration.passed = passed
+                    iteration.timeout = timed_out
+                    iteration.time = elapsed
+                    iteration.completed_at = time.time()
+                    if not passed:
+                        iteration.unsatisfied_constraints = environment.unsatisfied_constraints()
+                    break
+
+                wait_sec = self.poll_interval_sec
+                if timeout_sec is not None:
+                    remaining = timeout_sec - elapsed
+                    wait_sec = remaining if wait_sec is None else min(wait_sec, remaining)
+                try:
+                    with tracing.span("wait_for_change"):
+                        await asyncio.wait_for(changed.wait(), wait_sec)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for event in self.state_change_events:
+                environment.off(event, on_change)
+
+        with tracing.span("after_iteration"):
+            await self.after_iteration(self.scenario, self.environment, iteration)
+
+        return iteration
+
+    async def run_tests(self):
+        if not self.environment.validate_state():
+            return False
+        return await self.get_test_plan().run_async(self, self.get_deadline())
+
+    async def before(self, _, __):
+        pass
+
+    async def after(self, _, __, ___):
+        pass
+
+    async def before_iteration(self, _, __, ___):
+        pass
+
+    async def after_iteration(self, _, __, ___):
+        pass
+
+
+_test_runners_lock = threading.Lock()
+# resolved module path -> (mtime_ns, TestRunner class)
+_test_runners = {}
+
 def import_test_runner(module_path: str):
-    spec = importutil.spec_from_file_location("test_runner", module_path)
+    module_path = os.path.realpath(module_path)
+    mtime_ns = os.stat(module_path).st_mtime_ns
+
+    with _test_runners_lock:
+        cached = _test_runners.get(module_path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+
+        cls = load_test_runner(module_path)
+        _test_runners[module_path] = (mtime_ns, cls)
+
+    return cls
+
+def load_test_runner(module_path: str):
+    module_name = "myctest_test_runner_%s" % hashlib.sha1(module_path.encode()).hexdigest()[:12]
+    spec = importutil.spec_from_file_location(module_name, module_path)
     module = importutil.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
 
     cls = module.TestRunner
     if not issubclass(cls, BaseTestRunner):
         raise Exception("TestRunner class must inherit from BaseTestRunner: %s" % module_path)
     
-    return cls
\ No newline at end of file
+    return cls
@@ -1,11 +1,13 @@
 import os
-import glob
-import yaml
 import re
+import fnmatch
+import functools
 from typing import Optional, List, Dict
-import schema
 from myctest.config import MycConfig
-from rich import print
+from myctest.discovery import DiscoveryIndex, walk
+from myctest.scenario_cache import ScenarioCache, hash_content
+
+# yaml, schema and rich are imported lazily: listing and selecting scenarios must stay cheap
 
 class WithMetadata:
     metadata: Optional[Dict]
@@ -27,65 +29,159 @@ class Scenario(WithMetadata):
     description: Optional[str] = None
     timeout_sec: Optional[int] = 60
     iterations: Optional[int] = 1
+    concurrency: Optional[int] = 1
+    # with a target pass rate, iterations stop as soon as the pass rate is known to be above or below it
+    target_pass_rate: Optional[float] = None
+    confidence: Optional[float] = 0.95
     wait_for_agents: Optional[bool] = False
     test_runner_path: Optional[str] = None
     agents: List[ScenarioAgentConfig]
     environment: EnvironmentConfig
 
-scenario_config_schema = schema.Schema(
-    {
-        "name": schema.And(str, len),
-        schema.Optional("description"): str,
-        schema.Optional("iterations"): schema.And(
-            int,
-            lambda iterations: iterations >= 1,
-        ),
-        schema.Optional("timeout_sec"): schema.And(
-            int,
-            lambda timeout_sec: timeout_sec >= 0,
-        ),
-        schema.Optional("wait_for_agents"): bool,
-        schema.Optional("metadata"): schema.Or(dict, None),
-        schema.Optional("test_runner_path"): str,
-        "agents": [
-            {
-                "system_prompt": str,
-                schema.Optional("tools"): [str],
-                schema.Optional("messages"): [
-                    {
-                        "content": str,
-                        schema.Optional("metadata"): schema.Or(dict, None),
-                    }
-                ],
+@functools.lru_cache(maxsize=None)
+def get_scenario_config_schema():
+    import schema
+
+    return schema.Schema(
+        {
+            "name": schema.And(str, len),
+            schema.Optional("description"): str,
+            schema.Optional("iterations"): schema.And(
+                int,
+                lambda iterations: iterations >= 1,
+            ),
+            schema.Optional("concurrency"): schema.And(
+                int,
+                lambda concurrency: concurrency >= 1,
+            ),
+            schema.Optional("target_pass_rate"): schema.And(
+                schema.Or(int, float),
+                lambda target_pass_rate: 0 <= target_pass_rate <= 1,
+            ),
+            schema.Optional("confidence"): schema.And(
+                float,
+                lambda confidence: 0 < confidence < 1,
+            ),
+            schema.Optional("timeout_sec"): schema.And(
+                int,
+                lambda timeout_sec: timeout_sec >= 0,
+            ),
+            schema.Optional("wait_for_agents"): bool,
+            schema.Optional("metadata"): schema.Or(dict, None),
+            schema.Optional("test_runner_path"): str,
+            "agents": [
+                {
+                    "system_prompt": str,
+                    schema.Optional("tools"): [str],
+                    schema.Optional("messages"): [
+                        {
+                            "content": str,
+                            schema.Optional("metadata"): schema.Or(dict, None),
+                        }
+                    ],
+                    schema.Optional("metadata"): schema.Or(dict, None),
+                }
+            ],
+            "environment": {
+                schema.Optional("default_state"): dict,
+                schema.Optional("desired_state_schema"): dict,
                 schema.Optional("metadata"): schema.Or(dict, None),
             }
-        ],
-        "environment": {
-            schema.Optional("default_state"): dict,
-            schema.Optional("desired_state_schema"): dict,
-            schema.Optional("metadata"): schema.Or(dict, None),
         }
-    }
-)
+    )
 
-def get_scenarios(myc_config: MycConfig) -> list[(str, Scenario)]:
+def get_scenarios(myc_config: MycConfig, select: list[str] = None) -> list[(str, Scenario)]:
     scenarios = []
-    for file_path, scenario_config in load_scenarios(myc_config.root_dir, myc_config.scenarios_configs_patterns):
-        validate_scenario(file_path, scenario_config)
-        fill_scenario_with_defaults(scenario_config, myc_config)
+    cache = ScenarioCache(get_scenario_cache_path(myc_config), get_config_fingerprint(myc_config))
+    for file_path in get_selected_scenarios_paths(myc_config, select):
+        scenario_config = load_scenario_config(file_path, myc_config, cache)
+        validate_test_runner_path(file_path, scenario_config)
         scenarios.append((file_path, create_scenario(scenario_config, file_path, myc_config)))
 
+    cache.save()
+
     return scenarios
-       
+
+def get_scenario(myc_config: MycConfig, file_path: str) -> Scenario:
+    cache = ScenarioCache(get_scenario_cache_path(myc_config), get_config_fingerprint(myc_config))
+    scenario_config = load_scenario_config(file_path, myc_config, cache)
+    validate_test_runner_path(file_path, scenario_config)
+    cache.save()
+
+    return create_scenario(scenario_config, file_path, myc_config)
+
+def get_selected_scenarios_paths(myc_config: MycConfig, select: list[str] = None) -> list[str]:
+    # selection only needs paths and names, so it runs before any scenario is parsed or validated
+    selected = []
+    scenarios_paths = get_scenarios_paths(
+        myc_config.root_dir,
+        myc_config.scenarios_configs_patterns,
+        myc_config.scenarios_exclude_dirs_patterns,
+        get_discovery_index_path(myc_config),
+    )
+    for file_path in scenarios_paths:
+        relpath = os.path.relpath(file_path, myc_config.root_dir)
+        if not select or any(matches_selector(relpath, selector) for selector in select):
+            selected.append(file_path)
+            continue
+
+        name = peek_scenario_name(file_path)
+        if name is not None and any(matches_selector(name, selector) for selector in select):
+            selected.append(file_path)
+
+    return selected
+
+def matches_selector(value: str, selector: str) -> bool:
+    return selector in value or fnmatch.fnmatchcase(value, selector)
+
+scenario_name_regex = re.compile(r"^name:[ \t]*(?P<name>.*?)[ \t]*$", re.MULTILINE)
+
+def peek_scenario_name(file_path: str) -> Optional[str]:
+    # reads the top level "name:" key without parsing the whole YAML document
+    with open(file_path, "r") as stream:
+        match = scenario_name_regex.search(stream.read())
+
+    if match is None:
+        return None
+
+    name = match.group("name")
+    if len(name) >= 2 and name[0] == name[-1] and name[0] in "'\"":
+        name = name[1:-1]
+    return name
+
+def load_scenario_config(file_path: str, myc_config: MycConfig, cache: ScenarioCache) -> dict:
+    with open(file_path, "rb") as stream:
+        content = stream.read()
+
+    content_hash = hash_content(content)
+    scenario_config = cache.get(file_path, content_hash)
+    if scenario_config is None:
+        scenario_config = load_yaml(content)
+        validate_scenario(file_path, scenario_config)
+        fill_scenario_with_defaults(scenario_config, myc_config)
+        cache.set(file_path, content_hash, scenario_config)
+
+    return scenario_config
+
+def load_yaml(content: bytes):
+    import yaml
+
+    # LibYAML's C loader is several times faster, fall back to the pure python one when it is not available
+    return yaml.load(content, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+
 def create_scenario(scenario_config: dict, scenario_file_path: str, myc_config: MycConfig) -> Scenario:
     scenario = Scenario()
     scenario.name = scenario_config.get("name")
     scenario.description = scenario_config.get("description")
     scenario.timeout_sec = scenario_config.get("timeout_sec")
     scenario.iterations = scenario_config.get("iterations")
+    scenario.concurrency = scenario_config.get("concurrency")
+    scenario.target_pass_rate = scenario_config.get("target_pass_rate")
+    scenario.confidence = scenario_config.get("confidence")
     scenario.wait_for_agents = scenario_config.get("wait_for_agents")
     scenario.metadata = scenario_config.get("metadata")
-    scenario.test_runner_path = os.path.normpath(os.path.join(os.path.dirname(scenario_file_path), scenario_config["test_runner_path"]))
+    if scenario_config["test_runner_path"]:
+        scenario.test_runner_path = os.path.normpath(os.path.join(os.path.dirname(scenario_file_path), scenario_config["test_runner_path"]))
     scenario.environment = EnvironmentConfig()
     scenario.environment.default_state = scenario_config.get("environment", {}).get("default_state")
     scenario.environment.desired_state_schema = scenario_config.get("environment", {}).get("desired_state_schema")
@@ -110,6 +206,12 @@ def fill_scenario_with_defaults(scenario_config: dict, myc_config: MycConfig):
     if "iterations" not in scenario_config:
         scenario_config["iterations"] = myc_config.iterations
 
+    if "concurrency" not in scenario_config:
+        scenario_config["concurrency"] = myc_config.concurrency
+
+    if "confidence" not in scenario_config:
+        scenario_config["confidence"] = myc_config.confidence
+
     if "timeout_sec" not in scenario_config:
         scenario_config["timeout_sec"] = myc_config.timeout_sec
 
@@ -119,19 +221,16 @@ def fill_scenario_with_defaults(scenario_config: dict, myc_config: MycConfig):
     if "test_runner_path" not in scenario_config:
         scenario_config["test_runner_path"] = myc_config.default_test_runner_path
 
-def load_scenarios(directory: str, patterns: list[str]):
-    scenarios = []
-
-    for file_path in get_scenarios_paths(directory, patterns):
-        with open(file_path, "r") as stream:
-            parsed_scenario = yaml.safe_load(stream)
-            scenarios.append((file_path, parsed_scenario))
-
-    return scenarios
-
 def validate_scenario(file_path, scenario_config: dict):
     try:
-        scenario_config_schema.validate(scenario_config)
+        get_scenario_config_schema().validate(scenario_config)
+    except Exception as e:
+        from rich import print
+        print("Scenario config is invalid: %s" % file_path)
+        raise e
+
+def validate_test_runner_path(file_path, scenario_config: dict):
+    try:
         if scenario_config["test_runner_path"]:
             if not scenario_config["test_runner_path"].endswith('.py'):
                 raise Exception("Test runner file must be a python file: %s" % scenario_config["test_runner_path"])
@@ -140,19 +239,41 @@ def validate_scenario(file_path, scenario_config: dict):
             if not os.path.isfile(test_runner_path):
                 raise Exception("Test runner file not found: %s" % scenario_config["test_runner_path"])
     except Exception as e:
+        from rich import print
         print("Scenario config is invalid: %s" % file_path)
         raise e
 
-def get_scenarios_paths(directory: str, patterns: list[str]):
-    # TODO: do not walk through excluded directories and optimize this
-    for root, _, files in os.walk(directory):
-        files = [os.path.join(root, file) for file in files]
+def get_scenarios_paths(directory: str, patterns: list[str], exclude_dirs_patterns: list[str] = None, index_path: str = None):
+    patterns = [re.compile(pattern) for pattern in patterns]
+    exclude_dirs_patterns = [re.compile(pattern) for pattern in exclude_dirs_patterns or []]
+    index = DiscoveryIndex(index_path)
 
+    for root, files in walk(directory, exclude_dirs_patterns, index):
+        for file in files:
+            path = os.path.join(root, file)
+            if all(pattern.search(path) for pattern in patterns):
+                yield path
 
-        for pattern in patterns:
-            pattern = re.compile(pattern)
-            files = [path for path in files if pattern.search(path)]
+    index.save()
 
-        for file in files:
-            yield os.path.join(root, file)
+def get_discovery_index_path(myc_config: MycConfig) -> Optional[str]:
+    if not myc_config.cache_dir:
+        return None
+
+    return os.path.join(myc_config.root_dir, myc_config.cache_dir, "discovery-index.json")
+
+def get_scenario_cache_path(myc_config: MycConfig) -> Optional[str]:
+    if not myc_config.cache_dir:
+        return None
+
+    return os.path.join(myc_config.root_dir, myc_config.cache_dir, "scenarios-cache.pickle")
 
+def get_config_fingerprint(myc_config: MycConfig) -> str:
+    return repr((
+        myc_config.iterations,
+        myc_config.concurrency,
+        myc_config.confidence,
+        myc_config.timeout_sec,
+        myc_config.wait_for_agents,
+        myc_config.default_test_runner_path,
+    ))
@@ -0,0 +1,56 @@
+import os
+import pickle
+import hashlib
+from typing import Optional
+
+class ScenarioCache:
+    version = 1
+
+    def __init__(self, path: str = None, fingerprint: str = ""):
+        self.path = path
+        self.fingerprint = fingerprint
+        # scenario file path -> (content hash, validated scenario config filled with defaults)
+        self.entries = {}
+        self.visited = set()
+        self.changed = False
+        if path:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "rb") as stream:
+                cache = pickle.load(stream)
+        except Exception:
+            return
+
+        # configs are filled with MycConfig defaults, so a different config invalidates all of them
+        if cache.get("version") == self.version and cache.get("fingerprint") == self.fingerprint:
+            self.entries = cache.get("entries", {})
+
+    def save(self):
+        if not self.path or not self.changed:
+            return
+
+        # entries of scenarios that were not selected in this run are kept as long as their file exists
+        entries = {path: entry for path, entry in self.entries.items() if path in self.visited or os.path.exists(path)}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp_path, "wb") as stream:
+            pickle.dump({"version": self.version, "fingerprint": self.fingerprint, "entries": entries}, stream, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def get(self, path: str, content_hash: str) -> Optional[dict]:
+        self.visited.add(path)
+        entry = self.entries.get(path)
+        if entry is None or entry[0] != content_hash:
+            return None
+
+        return entry[1]
+
+    def set(self, path: str, content_hash: str, scenario_config: dict):
+        self.visited.add(path)
+        self.entries[path] = (content_hash, scenario_config)
+        self.changed = True
+
+def hash_content(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
@@ -0,0 +1,245 @@
+import os
+import json
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from myctest.ratelimit import TokenBucket
+from myctest.context import current_iteration
+from myctest.replay import Namespace, acreate_completion
+from myctest import tracing
+
+# Shared rate limiting of LLM calls. Every call first takes one request from the requests-per-minute
+# bucket and its estimated tokens from the tokens-per-minute bucket; the estimate is corrected with
+# the usage the provider reports once the call returns.
+#
+# Waiting calls are served earliest iteration deadline first. With a state file, the buckets and the
+# most urgent deadline of every process live in that file (under flock), so all worker processes of a
+# parallel run share one budget and one priority order.
+#
+# Time spent waiting is added to the current iteration's limiter_wait_time and recorded as
+# "llm.rate_limit" spans, separately from the time agents spend working.
+
+# set by `myc-test --rpm/--tpm`, read in the processes that run the agents
+RPM_ENV = "MYCTEST_LLM_RPM"
+TPM_ENV = "MYCTEST_LLM_TPM"
+STATE_ENV = "MYCTEST_LLM_LIMITER_STATE"
+
+# entries of processes that stopped updating the state file for this long are ignored
+STALE_WAITER_SEC = 2.0
+
+class _Ticket:
+    __slots__ = ("priority", "tokens", "done")
+
+    def __init__(self, priority: float, tokens: float):
+        self.priority = priority
+        self.tokens = tokens
+        self.done = False
+
+class RateLimitScheduler:
+    # upper bound of a single sleep, a more urgent call may arrive in the meantime
+    poll_interval_sec = 0.05
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, state_path: Optional[str] = None, burst_sec: float = 1.0):
+        # buckets shared through the state file refill by wall clock, the only clock processes agree on
+        clock = time.time if state_path else time.monotonic
+        self.buckets = {}
+        if rpm:
+            self.buckets["requests"] = TokenBucket.per_minute(rpm, max(rpm / 60 * burst_sec, 1), clock)
+        if tpm:
+            self.buckets["tokens"] = TokenBucket.per_minute(tpm, max(tpm / 60 * burst_sec, 1), clock)
+        self.state_path = state_path
+        self.process_key = str(os.getpid())
+        self.lock = threading.Lock()
+        self.waiting = []
+        self.sequence = itertools.count()
+
+    def acquire(self, tokens: float = 0, deadline: Optional[float] = None) -> float:
+        # blocks until the call may be made, returns the time spent waiting
+        ticket = self._enqueue(tokens, deadline)
+        start = time.monotonic()
+        with tracing.span("llm.rate_limit", "limiter", tokens=tokens):
+            try:
+                while True:
+                    wait_sec = self._attempt(ticket)
+                    if wait_sec == 0:
+                        break
+                    time.sleep(min(wait_sec, self.poll_interval_sec))
+            finally:
+                self._dequeue(ticket)
+        return self._account(time.monotonic() - start)
+
+    async def acquire_async(self, tokens: float = 0, deadline: Optional[float] = None) -> float:
+        ticket = self._enqueue(tokens, deadline)
+        start = time.monotonic()
+        with tracing.span("llm.rate_limit", "limiter", tokens=tokens):
+            try:
+                while True:
+                    wait_sec = self._attempt(ticket)
+                    if wait_sec == 0:
+                        break
+                    await asyncio.sleep(min(wait_sec, self.poll_interval_sec))
+            finally:
+                self._dequeue(ticket)
+        return self._account(time.monotonic() - start)
+
+    def settle(self, estimated_tokens: float, actual_tokens: Optional[float]):
+        # replaces the estimate taken by acquire with the usage reported by the provider
+        if actual_tokens is None or "tokens" not in self.buckets or actual_tokens == estimated_tokens:
+            return
+        with self.lock, self._shared_state():
+            self.buckets["tokens"].take(actual_tokens - estimated_tokens)
+
+    def _enqueue(self, tokens: float, deadline: Optional[float]) -> _Ticket:
+        if deadline is None:
+            iteration = current_iteration.get()
+            deadline = getattr(iteration, "deadline", None)
+        ticket = _Ticket(deadline if deadline is not None else math.inf, tokens)
+        with self.lock:
+            heapq.heappush(self.waiting, (ticket.priority, next(self.sequence), ticket))
+        return ticket
+
+    def _dequeue(self, ticket: _Ticket):
+        with self.lock:
+            ticket.done = True
+            while self.waiting and self.waiting[0][2].done:
+                heapq.heappop(self.waiting)
+
+    def _attempt(self, ticket: _Ticket) -> float:
+        # 0 when the ticket got its tokens, otherwise how long to wait before trying again
+        with self.lock:
+            if self.waiting[0][2] is not ticket:
+                return self.poll_interval_sec
+
+            with self._shared_state() as state:
+                if state is not None and self._more_urgent_elsewhere(state, ticket.priority):
+                    return self.poll_interval_sec
+
+                costs = {"requests": 1, "tokens": ticket.tokens}
+                wait_sec = max((bucket.wait_time(costs[name]) for name, bucket in self.buckets.items()), default=0.0)
+                if wait_sec == 0:
+                    for name, bucket in self.buckets.items():
+                        bucket.take(costs[name])
+                    if state is not None:
+                        # the next local waiter, if any, takes over this process' place in line
+                        next_waiting = [item for item in self.waiting if not item[2].done and item[2] is not ticket]
+                        self._publish(state, min(next_waiting)[0] if next_waiting else None)
+                elif state is not None:
+                    self._publish(state, ticket.priority)
+                return wait_sec
+
+    def _more_urgent_elsewhere(self, state: dict, priority: float) -> bool:
+        now = time.time()
+        for key, (other_priority, updated) in state.get("waiters", {}).items():
+            if key != self.process_key and now - updated < STALE_WAITER_SEC and other_priority < priority:
+                return True
+        return False
+
+    def _publish(self, state: dict, priority: Optional[float]):
+        waiters = state.setdefault("waiters", {})
+        if priority is None:
+            waiters.pop(self.process_key, None)
+        else:
+            waiters[self.process_key] = [priority, time.time()]
+
+    @contextmanager
+    def _shared_state(self):
+        # loads the buckets from the state file and writes them back, under an exclusive lock
+        if self.state_path is None:
+            yield None
+            return
+
+        import fcntl
+
+        with open(self.state_path, "a+") as stream:
+            fcntl.flock(stream, fcntl.LOCK_EX)
+            try:
+                stream.seek(0)
+                content = stream.read()
+                state = json.loads(content) if content else {}
+                for name, bucket in self.buckets.items():
+                    if name in state.get("buckets", {}):
+                        bucket.tokens, bucket.updated = state["buckets"][name]
+
+                yield state
+
+                state["buckets"] = {name: [bucket.tokens, bucket.updated] for name, bucket in self.buckets.items()}
+                stream.seek(0)
+                stream.truncate()
+                json.dump(state, stream)
+                stream.flush()
+            finally:
+                fcntl.flock(stream, fcntl.LOCK_UN)
+
+    def _account(self, waited: float) -> float:
+        iteration = current_iteration.get()
+        if iteration is not None and waited > 0:
+            with self.lock:
+                iteration.limiter_wait_time += waited
+        return waited
+
+def estimate_tokens(request: dict, completion_tokens: int = 256) -> int:
+    # ~4 characters per token for the prompt, plus the completion budget of the request
+    prompt_chars = 0
+    for message in request.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        prompt_chars += len(content) if isinstance(content, str) else len(json.dumps(content, default=str))
+    max_tokens = request.get("max_completion_tokens") or request.get("max_tokens") or completion_tokens
+    return prompt_chars // 4 + max_tokens
+
+def get_usage_tokens(completion) -> Optional[int]:
+    usage = completion.get("usage") if isinstance(completion, dict) else getattr(completion, "usage", None)
+    if usage is None:
+        return None
+    return usage.get("total_tokens") if isinstance(usage, dict) else getattr(usage, "total_tokens", None)
+
+class ScheduledClient:
+    # Drop-in wrapper for an OpenAI-style client: scheduled_client.chat.completions.create(**request)
+    def __init__(self, client, scheduler: RateLimitScheduler):
+        self.client = client
+        self.scheduler = scheduler
+        self.chat = Namespace(completions=Namespace(create=self.create, acreate=self.acreate))
+
+    def create(self, **request):
+        tokens = estimate_tokens(request)
+        self.scheduler.acquire(tokens)
+        completion = self.client.chat.completions.create(**request)
+        self.scheduler.settle(tokens, get_usage_tokens(completion))
+        return completion
+
+    async def acreate(self, **request):
+        tokens = estimate_tokens(request)
+        await self.scheduler.acquire_async(tokens)
+        completion = await acreate_completion(self.client, **request)
+        self.scheduler.settle(tokens, get_usage_tokens(completion))
+        return completion
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> Optional[RateLimitScheduler]:
+    # one scheduler per process, configured by myc-test flags; None when no limit is set
+    global _scheduler
+    rpm = os.getenv(RPM_ENV)
+    tpm = os.getenv(TPM_ENV)
+    if not rpm and not tpm:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RateLimitScheduler(
+                float(rpm) if rpm else None,
+                float(tpm) if tpm else None,
+                os.getenv(STATE_ENV) or None,
+            )
+        return _scheduler
+
+def schedule_client(client, scheduler: Optional[RateLimitScheduler] = None):
+    # returns the client untouched unless a rate limit is configured
+    scheduler = scheduler or get_scheduler()
+    if scheduler is None:
+        return client
+    return ScheduledClient(client, scheduler)
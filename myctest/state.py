@@ -0,0 +1,159 @@
+from collections.abc import Mapping
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_EMPTY_NODE = (None,) * _WIDTH
+
+class _Missing:
+    def __repr__(self):
+        return "MISSING"
+
+MISSING = _Missing()
+
+class PersistentMap(Mapping):
+    # Immutable mapping with structural sharing: a fixed two level trie (32 x 32 buckets) keyed by hash.
+    # set/delete copy only the path to one bucket, so old versions stay valid and can be kept as snapshots
+    # for free, and two versions derived from each other can be diffed by skipping shared subtrees.
+    __slots__ = ("_root", "_size")
+
+    def __init__(self, items=None):
+        self._root = _EMPTY_NODE
+        self._size = 0
+        if items:
+            self._build(items.items() if isinstance(items, Mapping) else items)
+
+    def _build(self, items):
+        buckets = {}
+        for key, value in items:
+            h = hash(key)
+            buckets.setdefault(h & _MASK, {}).setdefault((h >> _BITS) & _MASK, {})[key] = value
+
+        root = list(_EMPTY_NODE)
+        for i, node in buckets.items():
+            leaves = list(_EMPTY_NODE)
+            for j, leaf in node.items():
+                leaves[j] = leaf
+                self._size += len(leaf)
+            root[i] = tuple(leaves)
+        self._root = tuple(root)
+
+    @classmethod
+    def _create(cls, root, size):
+        instance = cls.__new__(cls)
+        instance._root = root
+        instance._size = size
+        return instance
+
+    def _leaf(self, key):
+        h = hash(key)
+        node = self._root[h & _MASK]
+        if node is None:
+            return None
+        return node[(h >> _BITS) & _MASK]
+
+    def __getitem__(self, key):
+        leaf = self._leaf(key)
+        if leaf is None:
+            raise KeyError(key)
+        return leaf[key]
+
+    def __contains__(self, key):
+        leaf = self._leaf(key)
+        return leaf is not None and key in leaf
+
+    def get(self, key, default=None):
+        leaf = self._leaf(key)
+        if leaf is None:
+            return default
+        return leaf.get(key, default)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for node in self._root:
+            if node is not None:
+                for leaf in node:
+                    if leaf is not None:
+                        yield from leaf
+
+    def items(self):
+        for node in self._root:
+            if node is not None:
+                for leaf in node:
+                    if leaf is not None:
+                        yield from leaf.items()
+
+    def __repr__(self):
+        return "PersistentMap(%r)" % dict(self.items())
+
+    def set(self, key, value) -> "PersistentMap":
+        h = hash(key)
+        i, j = h & _MASK, (h >> _BITS) & _MASK
+        node = self._root[i] or _EMPTY_NODE
+        leaf = node[j]
+        if leaf is not None and key in leaf and leaf[key] is value:
+            return self
+
+        new_leaf = dict(leaf) if leaf is not None else {}
+        size = self._size + (0 if key in new_leaf else 1)
+        new_leaf[key] = value
+        return self._replace(i, j, node, new_leaf, size)
+
+    def delete(self, key) -> "PersistentMap":
+        h = hash(key)
+        i, j = h & _MASK, (h >> _BITS) & _MASK
+        node = self._root[i] or _EMPTY_NODE
+        leaf = node[j]
+        if leaf is None or key not in leaf:
+            raise KeyError(key)
+
+        new_leaf = dict(leaf)
+        del new_leaf[key]
+        return self._replace(i, j, node, new_leaf or None, self._size - 1)
+
+    def _replace(self, i, j, node, leaf, size):
+        new_node = node[:j] + (leaf,) + node[j + 1:]
+        new_root = self._root[:i] + (new_node,) + self._root[i + 1:]
+        return self._create(new_root, size)
+
+    def diff(self, other: "PersistentMap") -> dict:
+        # key -> (value in self, value in other), MISSING when the key is absent on one side
+        changes = {}
+        if self._root is other._root:
+            return changes
+
+        for node_a, node_b in zip(self._root, other._root):
+            if node_a is node_b:
+                continue
+            for leaf_a, leaf_b in zip(node_a or _EMPTY_NODE, node_b or _EMPTY_NODE):
+                if leaf_a is leaf_b:
+                    continue
+                leaf_a = leaf_a or {}
+                leaf_b = leaf_b or {}
+                for key, value in leaf_a.items():
+                    other_value = leaf_b.get(key, MISSING)
+                    if other_value is not value and other_value != value:
+                        changes[key] = (value, other_value)
+                for key, value in leaf_b.items():
+                    if key not in leaf_a:
+                        changes[key] = (MISSING, value)
+
+        return changes
+
+def freeze(value):
+    if isinstance(value, PersistentMap):
+        return value
+    if isinstance(value, Mapping):
+        return PersistentMap((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+def thaw(value):
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
@@ -0,0 +1,125 @@
+import math
+from statistics import NormalDist
+from typing import Optional
+
+# Sequential testing of a scenario's pass rate against its target_pass_rate.
+#
+# Wald's sequential probability ratio test of "pass rate is target + indifference" (passed) against
+# "pass rate is target - indifference" (failed). After every iteration the log likelihood ratio of the
+# two is updated, and the run is decided once it crosses log((1 - beta) / alpha) or log(beta / (1 - alpha)),
+# with alpha = beta = 1 - confidence. The error rates hold for pass rates outside the indifference zone
+# around the target however often the results are looked at; inside it either decision is acceptable.
+# The reported interval is the Wilson score interval of all iterations.
+
+PASSED = "passed"
+FAILED = "failed"
+UNDECIDED = "undecided"
+
+def z_score(confidence: float) -> float:
+    return NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+
+def wilson_interval(passed: int, total: int, confidence: float = 0.95) -> tuple[float, float]:
+    if total == 0:
+        return 0.0, 1.0
+    z = z_score(confidence)
+    rate = passed / total
+    denominator = 1 + z * z / total
+    center = (rate + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(rate * (1 - rate) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+class SequentialTest:
+    def __init__(self, target_pass_rate: float, confidence: float = 0.95, indifference: float = 0.1):
+        self.target_pass_rate = target_pass_rate
+        self.confidence = confidence
+        error = 1 - confidence
+        low = min(max(target_pass_rate - indifference, 1e-6), 1 - 1e-6)
+        high = min(max(target_pass_rate + indifference, 1e-6), 1 - 1e-6)
+        # log likelihood ratio of one passed / failed iteration
+        self.pass_step = math.log(high / low)
+        self.fail_step = math.log((1 - high) / (1 - low))
+        self.upper_bound = math.log((1 - error) / error)
+        self.lower_bound = math.log(error / (1 - error))
+        self.log_ratio = 0.0
+        self.passed = 0
+        self.total = 0
+        self.decision = UNDECIDED
+
+    def add(self, passed: bool) -> str:
+        self.total += 1
+        self.passed += bool(passed)
+        self.log_ratio += self.pass_step if passed else self.fail_step
+        return self.decide()
+
+    def decide(self) -> str:
+        if self.log_ratio >= self.upper_bound:
+            self.decision = PASSED
+        elif self.log_ratio <= self.lower_bound:
+            self.decision = FAILED
+        else:
+            self.decision = UNDECIDED
+        return self.decision
+
+    @property
+    def decided(self) -> bool:
+        return self.decision != UNDECIDED
+
+    def interval(self) -> tuple[float, float]:
+        return wilson_interval(self.passed, self.total, self.confidence)
+
+def percentile(values: list[float], fraction: float) -> Optional[float]:
+    # linear interpolation between the closest ranks
+    if not values:
+        return None
+    values = sorted(values)
+    position = (len(values) - 1) * fraction
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def summarize_iterations(iterations: list, target_pass_rate: Optional[float] = None, confidence: float = 0.95) -> dict:
+    passed = sum(1 for iteration in iterations if iteration.passed)
+    total = len(iterations)
+    times = [iteration.time for iteration in iterations]
+    summary = {
+        "passed": passed,
+        "total": total,
+        "pass_rate": passed / total if total else None,
+        "confidence": confidence,
+        "ci_low": None,
+        "ci_high": None,
+        "p50_sec": percentile(times, 0.5),
+        "p95_sec": percentile(times, 0.95),
+        "limiter_wait_sec": sum(getattr(iteration, "limiter_wait_time", 0.0) for iteration in iterations),
+        "target_pass_rate": target_pass_rate,
+        "decision": None,
+    }
+    if not total:
+        return summary
+
+    if target_pass_rate is None:
+        summary["ci_low"], summary["ci_high"] = wilson_interval(passed, total, confidence)
+        return summary
+
+    # replayed in completion order, the first look that decided is the decision: iterations that were
+    # still running when a concurrent run stopped are reported, but do not undo it
+    test = SequentialTest(target_pass_rate, confidence)
+    for iteration in sorted(iterations, key=completion_order):
+        if test.add(iteration.passed) != UNDECIDED:
+            break
+    summary["decision"] = test.decision
+    summary["ci_low"], summary["ci_high"] = wilson_interval(passed, total, confidence)
+    return summary
+
+def completion_order(iteration):
+    completed_at = getattr(iteration, "completed_at", None)
+    return (completed_at is None, completed_at or 0, iteration.index)
+
+def summarize_scenario(scenario, iterations: list) -> dict:
+    return summarize_iterations(iterations, scenario.target_pass_rate, scenario.confidence)
+
+def meets_target(summary: dict) -> bool:
+    # an undecided run (all iterations used up) is judged by its point estimate
+    if summary["decision"] == UNDECIDED:
+        return summary["pass_rate"] >= summary["target_pass_rate"]
+    return summary["decision"] == PASSED
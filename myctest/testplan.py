@@ -0,0 +1,196 @@
+import time
+import queue
+import asyncio
+import inspect
+import threading
+import contextvars
+from typing import Optional
+from myctest import tracing
+
+# The test* methods of a runner class, resolved once per class. Tests run cheapest first (by their
+# measured mean time) and stop at the first failure, so a check that fails costs one cheap test.
+# Each test gets a deadline: its own timeout (see timeout()), the runner's test_timeout_sec, and never
+# more than the time left in the iteration. Sync tests with a deadline run on a helper thread, a test
+# that overruns it counts as failed and is left to finish in the background, threads cannot be killed.
+
+# the last check at the iteration deadline still gets a chance to finish
+MIN_TEST_TIMEOUT_SEC = 0.05
+
+def timeout(seconds: float):
+    # per-test deadline: @timeout(2) def test_file_written(self): ...
+    def decorate(func):
+        func.myctest_timeout_sec = seconds
+        return func
+    return decorate
+
+class TestCase:
+    __slots__ = ("name", "func", "timeout_sec", "span_name", "runs", "total_time", "max_time", "failures", "timeouts")
+
+    def __init__(self, name: str, func):
+        self.name = name
+        self.func = func
+        self.timeout_sec = getattr(func, "myctest_timeout_sec", None)
+        self.span_name = "test:%s" % name
+        self.runs = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.failures = 0
+        self.timeouts = 0
+
+    @property
+    def mean_time(self) -> float:
+        return self.total_time / self.runs if self.runs else 0.0
+
+    def __repr__(self):
+        return "TestCase(%s, runs=%d, mean_time=%f)" % (self.name, self.runs, self.mean_time)
+
+class TestPlan:
+    def __init__(self, cls):
+        self.lock = threading.Lock()
+        # plain functions only, called with the runner; dir() order until there are timings
+        self.tests = tuple(
+            TestCase(name, getattr(cls, name))
+            for name in dir(cls)
+            if name.startswith("test") and inspect.isfunction(inspect.getattr_static(cls, name))
+        )
+
+    def timeout_sec(self, test: TestCase, runner, deadline: Optional[float]) -> Optional[float]:
+        timeout_sec = test.timeout_sec if test.timeout_sec is not None else runner.test_timeout_sec
+        if deadline is not None:
+            remaining = max(deadline - time.time(), MIN_TEST_TIMEOUT_SEC)
+            timeout_sec = remaining if timeout_sec is None else min(timeout_sec, remaining)
+        return timeout_sec
+
+    def run(self, runner, deadline: Optional[float] = None) -> bool:
+        # True when every test passes; deadline is the iteration's, in time.time()
+        for test in self.tests:
+            timeout_sec = self.timeout_sec(test, runner, deadline)
+            timed_out = False
+            start = time.perf_counter()
+            with tracing.span(test.span_name, "test"):
+                if timeout_sec is None:
+                    passed = test.func(runner)
+                else:
+                    finished, passed = _call_with_timeout(test.func, runner, timeout_sec)
+                    timed_out = not finished
+            passed = self.record(test, time.perf_counter() - start, passed, timed_out)
+            if not passed:
+                return False
+        return True
+
+    async def run_async(self, runner, deadline: Optional[float] = None) -> bool:
+        # sync tests run inline, they share the event loop with the agents
+        for test in self.tests:
+            timeout_sec = self.timeout_sec(test, runner, deadline)
+            timed_out = False
+            start = time.perf_counter()
+            with tracing.span(test.span_name, "test"):
+                passed = test.func(runner)
+                if inspect.isawaitable(passed):
+                    try:
+                        passed = await asyncio.wait_for(passed, timeout_sec) if timeout_sec is not None else await passed
+                    except asyncio.TimeoutError:
+                        passed = False
+                        timed_out = True
+            passed = self.record(test, time.perf_counter() - start, passed, timed_out)
+            if not passed:
+                return False
+        return True
+
+    def record(self, test: TestCase, elapsed: float, passed, timed_out: bool) -> bool:
+        passed = bool(passed) and not timed_out
+        with self.lock:
+            test.runs += 1
+            test.total_time += elapsed
+            test.max_time = max(test.max_time, elapsed)
+            test.failures += not passed
+            test.timeouts += timed_out
+            tests = self.tests
+            if any(tests[index].mean_time > tests[index + 1].mean_time for index in range(len(tests) - 1)):
+                # replaced, not mutated: plans are shared by concurrent iterations
+                self.tests = tuple(sorted(tests, key=lambda test: test.mean_time))
+        return passed
+
+    def timings(self) -> dict:
+        with self.lock:
+            return {
+                test.name: {
+                    "runs": test.runs,
+                    "mean_sec": test.mean_time,
+                    "max_sec": test.max_time,
+                    "failures": test.failures,
+                    "timeouts": test.timeouts,
+                }
+                for test in self.tests
+            }
+
+_plans_lock = threading.Lock()
+
+def get_test_plan(cls) -> TestPlan:
+    # stored on the class itself, a runner module reloaded after an edit gets a new plan
+    plan = cls.__dict__.get("_test_plan")
+    if plan is None:
+        with _plans_lock:
+            plan = cls.__dict__.get("_test_plan")
+            if plan is None:
+                plan = TestPlan(cls)
+                setattr(cls, "_test_plan", plan)
+    return plan
+
+class _Call:
+    __slots__ = ("func", "runner", "context", "finished", "result", "error")
+
+    def __init__(self, func, runner):
+        self.func = func
+        self.runner = runner
+        # the iteration's context variables (current iteration, agent) follow the test
+        self.context = contextvars.copy_context()
+        self.finished = threading.Event()
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.context.run(self.func, self.runner)
+        except BaseException as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+class _TestThread:
+    # one per calling thread, so concurrent iterations do not wait on each other's tests
+    def __init__(self):
+        self.calls = queue.SimpleQueue()
+        threading.Thread(target=_serve, args=(self.calls,), daemon=True, name="myctest-tests").start()
+
+    def submit(self, func, runner) -> _Call:
+        call = _Call(func, runner)
+        self.calls.put(call)
+        return call
+
+    def __del__(self):
+        # the helper exits once it is done with the current call
+        self.calls.put(None)
+
+def _serve(calls: queue.SimpleQueue):
+    while True:
+        call = calls.get()
+        if call is None:
+            return
+        call.run()
+
+_test_threads = threading.local()
+
+def _call_with_timeout(func, runner, timeout_sec: float):
+    # (finished, result); a call that did not finish keeps its thread, the next one gets a new thread
+    thread = getattr(_test_threads, "thread", None)
+    if thread is None:
+        thread = _test_threads.thread = _TestThread()
+
+    call = thread.submit(func, runner)
+    if not call.finished.wait(timeout_sec):
+        _test_threads.thread = None
+        return False, False
+    if call.error is not None:
+        raise call.error
+    return True, call.result
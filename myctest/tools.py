@@ -0,0 +1,166 @@
+import json
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, NamedTuple
+from myctest import tracing
+
+# Tools agents can call. Specs are built once per tool and handed out as one immutable tuple per set of
+# allowed tools, argument schemas are compiled into a validator when the tool is registered, and the
+# tool calls of one assistant message run concurrently, with results returned in call order.
+
+JSON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+    "null": (type(None),),
+}
+
+class ArgumentsValidator:
+    # the subset of JSON schema tool parameters use: top level property types, required, enum, additionalProperties
+    def __init__(self, parameters: Optional[dict]):
+        parameters = parameters or {}
+        self.required = tuple(parameters.get("required") or ())
+        self.additional = parameters.get("additionalProperties", True)
+        self.properties = {}
+        for name, schema in (parameters.get("properties") or {}).items():
+            types = schema.get("type")
+            if isinstance(types, str):
+                types = [types]
+            python_types = tuple(python_type for json_type in types or () for python_type in JSON_TYPES.get(json_type, ()))
+            enum = frozenset(schema["enum"]) if "enum" in schema else None
+            self.properties[name] = (python_types or None, enum)
+
+    def validate(self, params) -> Optional[str]:
+        # None when valid, otherwise a message meant for the model
+        if not isinstance(params, dict):
+            return "Arguments must be a JSON object"
+        for name in self.required:
+            if name not in params:
+                return "Missing argument: %s" % name
+        for name, value in params.items():
+            rule = self.properties.get(name)
+            if rule is None:
+                if self.additional is False:
+                    return "Unknown argument: %s" % name
+                continue
+            python_types, enum = rule
+            # bool is an int in python, but not an integer or number in JSON
+            if python_types is not None and (not isinstance(value, python_types) or (isinstance(value, bool) and bool not in python_types)):
+                return "Invalid type of argument: %s" % name
+            if enum is not None and value not in enum:
+                return "Invalid value of argument: %s" % name
+        return None
+
+class Tool:
+    __slots__ = ("name", "description", "parameters", "func", "spec", "validator")
+
+    def __init__(self, name: str, description: str, parameters: dict, func):
+        self.name = name
+        self.description = description
+        self.parameters = parameters
+        self.func = func
+        self.spec = {
+            "type": "function",
+            "function": {
+                "name": name,
+                "description": description,
+                "parameters": parameters,
+            },
+        }
+        self.validator = ArgumentsValidator(parameters)
+
+    def run(self, agent_id, params):
+        return self.func(_agent_id=agent_id, **params)
+
+    def get_spec(self):
+        return self.spec
+
+class ToolResult(NamedTuple):
+    tool_call_id: str
+    name: str
+    content: str
+
+class ToolsService:
+    def __init__(self, max_workers: int = 8):
+        self.tools = {}
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        # frozenset of allowed tool names (None for all) -> tuple of specs
+        self._specs = {}
+        self._executor = None
+
+    def register_tool(self, name, description, parameters, func):
+        with self.lock:
+            self.tools[name] = Tool(name, description, parameters, func)
+            self._specs = {}
+
+    def get_tools_specs(self, tools = None) -> tuple:
+        key = frozenset(tools) if tools is not None else None
+        specs = self._specs.get(key)
+        if specs is None:
+            with self.lock:
+                specs = tuple(tool.spec for tool in self.tools.values() if key is None or tool.name in key)
+                self._specs[key] = specs
+        return specs
+
+    def execute_tool(self, agent_id, name, params):
+        with tracing.span("tool:%s" % name, "tool", agent=agent_id, tool=name):
+            return self.tools[name].run(agent_id, params)
+
+    def execute_tool_calls(self, agent_id, tool_calls) -> list[ToolResult]:
+        # tool calls of one assistant message, run concurrently; results are in the order of the calls
+        calls = []
+        for tool_call in tool_calls:
+            name = tool_call.function.name
+            params, error = self.parse_arguments(name, tool_call.function.arguments)
+            calls.append((tool_call.id, name, params, error))
+
+        runnable = [index for index, call in enumerate(calls) if call[3] is None]
+        outcomes = {}
+        if len(runnable) == 1:
+            _, name, params, _ = calls[runnable[0]]
+            outcomes[runnable[0]] = self._run(agent_id, name, params)
+        elif runnable:
+            executor = self._get_executor()
+            # threads do not inherit context variables (current agent, iteration), each call gets a copy
+            futures = {
+                index: executor.submit(contextvars.copy_context().run, self._run, agent_id, calls[index][1], calls[index][2])
+                for index in runnable
+            }
+            outcomes = {index: future.result() for index, future in futures.items()}
+
+        return [
+            ToolResult(tool_call_id, name, error if error is not None else outcomes[index])
+            for index, (tool_call_id, name, _, error) in enumerate(calls)
+        ]
+
+    def parse_arguments(self, name: str, arguments: Optional[str]):
+        tool = self.tools.get(name)
+        if tool is None:
+            return None, "Unknown tool"
+        try:
+            params = json.loads(arguments) if arguments else {}
+        except ValueError:
+            return None, "Invalid params"
+        error = tool.validator.validate(params)
+        if error is not None:
+            return None, "Invalid params: %s" % error
+        return params, None
+
+    def _run(self, agent_id, name, params) -> str:
+        try:
+            result = self.execute_tool(agent_id, name, params)
+        except Exception as e:
+            return "Tool failed: %s" % e
+        return result if isinstance(result, str) else json.dumps(result) if result is not None else ""
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self.lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tools")
+        return self._executor
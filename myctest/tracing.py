@@ -0,0 +1,175 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import Counter
+from myctest.context import current_agent, get_iteration_index
+
+# Spans are recorded only while a Tracer is enabled; otherwise span() returns a shared no-op
+# context manager, so instrumented code pays one global lookup per span.
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+    def tag(self, **_):
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class Span:
+    __slots__ = ("tracer", "name", "category", "tags", "tid", "start_ns", "end_ns")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, tags: dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.tags = tags
+        self.tid = _task_or_thread_id()
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, *_):
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.tags["error"] = exc_type.__name__
+        self.tracer.record(self)
+        return False
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+def _task_or_thread_id() -> int:
+    # spans of concurrent asyncio tasks interleave on one thread, so each task gets its own track
+    if asyncio._get_running_loop() is not None:
+        task = asyncio.current_task()
+        if task is not None:
+            return id(task)
+    return threading.get_ident()
+
+class Tracer:
+    def __init__(self):
+        self.spans: list[Span] = []
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def span(self, name: str, category: str = "runner", **tags) -> Span:
+        agent_id = current_agent.get()
+        if agent_id is not None and "agent" not in tags:
+            tags["agent"] = agent_id
+        iteration_index = get_iteration_index()
+        if iteration_index is not None and "iteration" not in tags:
+            tags["iteration"] = iteration_index
+        return Span(self, name, category, tags)
+
+    def record(self, span: Span):
+        with self.lock:
+            self.spans.append(span)
+
+    def chrome_trace(self) -> dict:
+        # Chrome trace event format, loads in chrome://tracing and https://ui.perfetto.dev
+        with self.lock:
+            spans = list(self.spans)
+
+        origin_ns = min((span.start_ns for span in spans), default=0)
+        events = [
+            {
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": (span.start_ns - origin_ns) / 1000,
+                "dur": span.duration_ns / 1000,
+                "pid": self.pid,
+                "tid": span.tid,
+                "args": {key: _jsonable(value) for key, value in span.tags.items()},
+            }
+            for span in spans
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path: str):
+        with open(path, "w") as stream:
+            json.dump(self.chrome_trace(), stream)
+
+    def folded_stacks(self) -> Counter:
+        # self time in microseconds per stack ("iteration;action:write"), spans are nested by time
+        # containment within their thread or task; the format flamegraph.pl and speedscope read
+        with self.lock:
+            spans = sorted(self.spans, key=lambda span: (span.tid, span.start_ns, -span.end_ns))
+
+        folded = Counter()
+        stack = []
+        children_ns = {}
+        current_tid = None
+
+        def close(span):
+            names = ";".join(item.name for item in stack)
+            folded[names] += (span.duration_ns - children_ns.pop(id(span), 0)) // 1000
+            stack.pop()
+            if stack:
+                children_ns[id(stack[-1])] = children_ns.get(id(stack[-1]), 0) + span.duration_ns
+
+        for span in spans:
+            if span.tid != current_tid:
+                while stack:
+                    close(stack[-1])
+                current_tid = span.tid
+            while stack and stack[-1].end_ns <= span.start_ns:
+                close(stack[-1])
+            stack.append(span)
+        while stack:
+            close(stack[-1])
+
+        return folded
+
+    def export_folded_stacks(self, path: str):
+        with open(path, "w") as stream:
+            for names, microseconds in sorted(self.folded_stacks().items()):
+                stream.write("%s %d\n" % (names, microseconds))
+
+    def category_totals(self) -> dict:
+        # total span time per category in seconds (nested spans are counted in each of their categories)
+        totals = Counter()
+        with self.lock:
+            for span in self.spans:
+                totals[span.category] += span.duration_ns / 1e9
+        return dict(totals)
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return repr(value)
+
+_tracer = None
+
+def enable_tracing() -> Tracer:
+    global _tracer
+    _tracer = Tracer()
+    return _tracer
+
+def disable_tracing():
+    global _tracer
+    _tracer = None
+
+def get_tracer():
+    return _tracer
+
+def span(name: str, category: str = "runner", **tags):
+    tracer = _tracer
+    if tracer is None:
+        return NULL_SPAN
+    return tracer.span(name, category, **tags)
@@ -0,0 +1,101 @@
+import threading
+from collections.abc import Mapping
+from typing import Callable
+from myctest.state import PersistentMap, MISSING, freeze
+
+class Constraint:
+    __slots__ = ("path", "expected")
+
+    def __init__(self, path: tuple, expected):
+        self.path = path
+        self.expected = expected
+
+    def check(self, state: PersistentMap) -> bool:
+        node = state
+        for key in self.path:
+            if not isinstance(node, Mapping) or key not in node:
+                return False
+            node = node[key]
+        return node == self.expected
+
+    def actual(self, state: PersistentMap):
+        node = state
+        for key in self.path:
+            if not isinstance(node, Mapping) or key not in node:
+                return MISSING
+            node = node[key]
+        return node
+
+    def affected_by(self, path: tuple) -> bool:
+        # a change at path affects the constraint when one path is a prefix of the other
+        length = min(len(path), len(self.path))
+        return self.path[:length] == path[:length]
+
+    def __str__(self):
+        return "%s == %r" % (".".join(str(key) for key in self.path), self.expected)
+
+class CompiledStateSchema:
+    # desired_state_schema compiled into leaf constraints: nested mappings are walked down to
+    # values, and every value (or empty mapping) becomes a `path == value` constraint
+    def __init__(self, desired_state_schema: dict = None):
+        self.constraints = []
+        # top level key -> indexes of constraints under it
+        self.by_key = {}
+        self._compile((), desired_state_schema or {})
+
+    def _compile(self, path: tuple, node):
+        if isinstance(node, Mapping) and (node or not path):
+            for key, value in node.items():
+                self._compile(path + (key,), value)
+            return
+
+        self.by_key.setdefault(path[0], []).append(len(self.constraints))
+        self.constraints.append(Constraint(path, freeze(node)))
+
+class StateValidator:
+    def __init__(self, compiled_schema: CompiledStateSchema):
+        self.compiled_schema = compiled_schema
+        self.satisfied = [False] * len(compiled_schema.constraints)
+        self.unsatisfied_count = len(self.satisfied)
+        # paths changed since the last validation, None means everything has to be checked
+        self.dirty = None
+        # agents write (and invalidate) from their own threads while the runner validates
+        self.lock = threading.Lock()
+
+    def invalidate(self, path: tuple = None):
+        with self.lock:
+            if path is None:
+                self.dirty = None
+            elif self.dirty is not None:
+                self.dirty.add(path)
+
+    def validate(self, get_state: Callable[[], PersistentMap]) -> bool:
+        with self.lock:
+            dirty, self.dirty = self.dirty, set()
+            # writers update the state before invalidating, so a state read after taking the dirty
+            # paths includes every change in them; later changes land in the new set
+            state = get_state()
+            return self._check(state, dirty)
+
+    def _check(self, state: PersistentMap, dirty) -> bool:
+        constraints = self.compiled_schema.constraints
+
+        if dirty is None:
+            indexes = range(len(constraints))
+        else:
+            indexes = set()
+            for path in dirty:
+                for index in self.compiled_schema.by_key.get(path[0], ()):
+                    if constraints[index].affected_by(path):
+                        indexes.add(index)
+
+        for index in indexes:
+            satisfied = constraints[index].check(state)
+            if satisfied != self.satisfied[index]:
+                self.satisfied[index] = satisfied
+                self.unsatisfied_count += -1 if satisfied else 1
+
+        return self.unsatisfied_count == 0
+
+    def unsatisfied(self) -> list[Constraint]:
+        return [constraint for constraint, satisfied in zip(self.compiled_schema.constraints, self.satisfied) if not satisfied]
@@ -0,0 +1,197 @@
+import os
+import ast
+import time
+import traceback
+from typing import Optional
+from myctest.config import MycConfig
+from myctest.scenario import Scenario, get_scenarios, get_selected_scenarios_paths
+from myctest.scenario_cache import hash_content
+from myctest.executor import ScenarioResult, run_scenarios
+
+# `myc-test --watch`: every scenario depends on its YAML file, its test runner and the local modules the
+# runner imports (found by parsing imports, recursively, without executing anything). Files are polled
+# with os.stat and only hashed when their stat changes, so saving a file without editing it re-runs
+# nothing. Affected scenarios re-run in fresh processes, results of the others are kept.
+
+class FileStates:
+    def __init__(self):
+        # path -> (mtime_ns, size, content hash or None when missing)
+        self.states = {}
+
+    def _stat(self, path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _hash(self, path: str) -> Optional[str]:
+        try:
+            with open(path, "rb") as stream:
+                return hash_content(stream.read())
+        except OSError:
+            return None
+
+    def track(self, path: str) -> Optional[str]:
+        state = self.states.get(path)
+        stat = self._stat(path)
+        if state is not None and stat is not None and state[:2] == stat:
+            return state[2]
+        content_hash = self._hash(path) if stat is not None else None
+        self.states[path] = (*(stat or (None, None)), content_hash)
+        return content_hash
+
+    def changed(self) -> set[str]:
+        changed = set()
+        for path, (mtime_ns, size, content_hash) in list(self.states.items()):
+            if (self._stat(path) or (None, None)) == (mtime_ns, size):
+                continue
+            if self.track(path) != content_hash:
+                changed.add(path)
+        return changed
+
+class DependencyGraph:
+    def __init__(self, root_dir: str, files: FileStates):
+        self.root_dir = os.path.realpath(root_dir)
+        self.files = files
+        # scenario path -> files it depends on
+        self.dependencies = {}
+        # module path -> (content hash, local modules it imports)
+        self.imports = {}
+
+    def update(self, scenario_path: str, scenario: Scenario):
+        dependencies = {scenario_path}
+        if scenario.test_runner_path:
+            pending = [os.path.realpath(scenario.test_runner_path)]
+            while pending:
+                path = pending.pop()
+                if path in dependencies:
+                    continue
+                dependencies.add(path)
+                pending.extend(self.local_imports(path))
+        for path in dependencies:
+            self.files.track(path)
+        self.dependencies[scenario_path] = dependencies
+
+    def remove(self, scenario_path: str):
+        self.dependencies.pop(scenario_path, None)
+
+    def affected(self, changed: set[str]) -> set[str]:
+        return {scenario_path for scenario_path, dependencies in self.dependencies.items() if dependencies & changed}
+
+    def local_imports(self, path: str) -> list[str]:
+        content_hash = self.files.track(path)
+        cached = self.imports.get(path)
+        if cached is not None and cached[0] == content_hash:
+            return cached[1]
+
+        modules = []
+        try:
+            with open(path, "rb") as stream:
+                tree = ast.parse(stream.read(), path)
+        except (OSError, SyntaxError, ValueError):
+            # a runner that does not parse is still watched, it fails when the scenario runs
+            tree = None
+
+        for node in ast.walk(tree) if tree is not None else ():
+            if isinstance(node, ast.Import):
+                for alias in node.names:
+                    modules.extend(self.resolve(path, alias.name, 0))
+            elif isinstance(node, ast.ImportFrom):
+                base = node.module or ""
+                modules.extend(self.resolve(path, base, node.level))
+                # `from package import module` imports a module, not only a name
+                for alias in node.names:
+                    modules.extend(self.resolve(path, "%s.%s" % (base, alias.name) if base else alias.name, node.level))
+
+        modules = sorted(set(modules))
+        self.imports[path] = (content_hash, modules)
+        return modules
+
+    def resolve(self, importer: str, module: str, level: int) -> list[str]:
+        # runners are loaded from their file path, so local imports resolve against the runner's
+        # directory (relative imports) or the root directory (the working directory of myc-test)
+        directory = os.path.dirname(importer)
+        if level:
+            for _ in range(level - 1):
+                directory = os.path.dirname(directory)
+            bases = [directory]
+        else:
+            bases = [directory, self.root_dir]
+
+        parts = [part for part in module.split(".") if part]
+        found = []
+        for base in bases:
+            for index in range(1, len(parts) + 1):
+                # every package on the way is imported too
+                package_path = os.path.join(base, *parts[:index])
+                for candidate in (package_path + ".py", os.path.join(package_path, "__init__.py")):
+                    candidate = os.path.realpath(candidate)
+                    if candidate.startswith(self.root_dir + os.sep) and os.path.isfile(candidate):
+                        found.append(candidate)
+        return found
+
+class Watcher:
+    def __init__(self, config: MycConfig, select: list[str] = None, workers: int = 1, interval_sec: float = 0.5, report = None, on_start = None):
+        self.config = config
+        self.select = select
+        self.workers = workers
+        self.interval_sec = interval_sec
+        self.report = report
+        self.on_start = on_start
+        self.files = FileStates()
+        self.graph = DependencyGraph(config.root_dir, self.files)
+        self.results: dict[str, ScenarioResult] = {}
+        self.dirty: set[str] = set()
+        self.scenario_paths: list[str] = []
+
+    def run(self):
+        while True:
+            self.run_affected()
+            self.wait_for_changes()
+
+    def run_affected(self) -> list[ScenarioResult]:
+        try:
+            scenarios = get_scenarios(self.config, self.select)
+        except Exception:
+            traceback.print_exc()
+            # retried once any scenario file changes
+            self.scenario_paths = get_selected_scenarios_paths(self.config, self.select)
+            for path in self.scenario_paths:
+                self.files.track(path)
+            return []
+
+        self.scenario_paths = [path for path, _ in scenarios]
+        for path in set(self.results) - set(self.scenario_paths):
+            del self.results[path]
+            self.graph.remove(path)
+
+        affected = [(path, scenario) for path, scenario in scenarios if path not in self.results or path in self.dirty]
+        for path, scenario in affected:
+            self.graph.update(path, scenario)
+        self.dirty.clear()
+
+        # runners and their local modules are only ever imported in fresh worker processes,
+        # so every re-run sees the current code
+        results = run_scenarios(affected, self.workers, self.on_start, isolated=True)
+        for result in results:
+            self.results[result.scenario_path] = result
+
+        ordered = [self.results[path] for path in self.scenario_paths]
+        for index, result in enumerate(ordered):
+            result.index = index
+        if self.report:
+            self.report(ordered)
+        return results
+
+    def wait_for_changes(self):
+        while True:
+            time.sleep(self.interval_sec)
+
+            changed = self.files.changed()
+            affected = self.graph.affected(changed) | (changed & set(self.scenario_paths))
+            # a scenario file that appeared or disappeared
+            scenario_paths = get_selected_scenarios_paths(self.config, self.select)
+            if affected or scenario_paths != self.scenario_paths:
+                self.dirty |= affected
+                return
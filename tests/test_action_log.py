@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+from array import array
+from myctest.action_log import ActionLogWriter, ActionLogReader, COLUMNS, column_path, encode_args
+
+class ActionLogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def records(self) -> list:
+        with ActionLogReader(self.path) as reader:
+            return [(record["iteration"], record["agent"], record["action"], record["args"]) for record in reader.records()]
+
+    def test_reopen_appends_after_existing_rows(self):
+        with ActionLogWriter(self.path) as writer:
+            writer.append("write", ("a", 1), 0, "boss")
+        with ActionLogWriter(self.path) as writer:
+            writer.append("send", ("b",), 1, "employee")
+        self.assertEqual(self.records(), [(0, "boss", "write", ["a", 1]), (1, "employee", "send", ["b"])])
+
+    def test_reopen_truncates_rows_of_an_interrupted_flush(self):
+        with ActionLogWriter(self.path) as writer:
+            writer.append("write", ("a", 1), 0, "boss")
+            writer.append("write", ("b", 2), 1, "boss")
+
+        # a flush killed after the args and the first two columns of a new row
+        with open(os.path.join(self.path, "args.bin"), "ab") as stream:
+            stream.write(encode_args(("lost",)))
+        for name, code in COLUMNS[:2]:
+            with open(column_path(self.path, name), "ab") as stream:
+                array(code, [7]).tofile(stream)
+        # and half way through the third
+        with open(column_path(self.path, COLUMNS[2][0]), "ab") as stream:
+            stream.write(b"\x01\x02")
+
+        with ActionLogWriter(self.path) as writer:
+            writer.append("send", ("c",), 2, "employee")
+
+        self.assertEqual(self.records(), [
+            (0, "boss", "write", ["a", 1]),
+            (1, "boss", "write", ["b", 2]),
+            (2, "employee", "send", ["c"]),
+        ])
+        sizes = {name: os.path.getsize(column_path(self.path, name)) // array(code).itemsize for name, code in COLUMNS}
+        self.assertEqual(set(sizes.values()), {3})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import unittest
+from myctest.observable import Observable
+from myctest.bus import MessageBus, MessageBusFull, MESSAGE_EVENTS, BLOCK, DROP_OLDEST, REJECT
+
+class MessageBusTest(unittest.TestCase):
+    def setUp(self):
+        self.observable = Observable(MESSAGE_EVENTS)
+        self.events = []
+        for event in MESSAGE_EVENTS:
+            self.observable.on(event, lambda message, event=event: self.events.append((event, message.recipient, message.content)))
+
+    def test_drop_oldest_keeps_newest_messages(self):
+        bus = MessageBus(self.observable, maxsize=2, policy=DROP_OLDEST)
+        bus.register("a")
+        bus.register("b")
+        for content in range(4):
+            self.assertTrue(bus.send("a", "b", content))
+
+        self.assertEqual([message.content for message in bus.receive("b")], [2, 3])
+        self.assertEqual(bus.stats(), {("a", "b"): {"sent": 4, "delivered": 2, "dropped": 2}})
+        self.assertEqual(
+            [event for event in self.events if event[0] != "message.sent"],
+            [("message.dropped", "b", 0), ("message.dropped", "b", 1), ("message.delivered", "b", 2), ("message.delivered", "b", 3)],
+        )
+        self.assertEqual([event[2] for event in self.events if event[0] == "message.sent"], [0, 1, 2, 3])
+
+    def test_reject_raises_and_keeps_queued_messages(self):
+        bus = MessageBus(self.observable, maxsize=1, policy=REJECT)
+        bus.register("a")
+        bus.register("b")
+        bus.register("c", maxsize=10)
+        bus.send("a", "b", "first")
+
+        # the broadcast still reaches c, b's full mailbox raises after the others got it
+        with self.assertRaises(MessageBusFull):
+            bus.broadcast("a", "second")
+        self.assertEqual([message.content for message in bus.receive("b")], ["first"])
+        self.assertEqual([message.content for message in bus.receive("c")], ["second"])
+        self.assertEqual(bus.stats()[("a", "b")], {"sent": 2, "delivered": 1, "dropped": 1})
+        self.assertEqual(bus.stats()[("a", "c")], {"sent": 1, "delivered": 1, "dropped": 0})
+        self.assertIn(("message.dropped", "b", "second"), self.events)
+
+    def test_block_waits_for_the_recipient_to_drain(self):
+        bus = MessageBus(self.observable, maxsize=1, policy=BLOCK, block_timeout_sec=5)
+        bus.register("a")
+        bus.register("b")
+        bus.send("a", "b", "first")
+
+        drainer = threading.Timer(0.05, lambda: bus.receive("b"))
+        drainer.start()
+        self.assertTrue(bus.send("a", "b", "second"))
+        drainer.join()
+
+        self.assertEqual([message.content for message in bus.receive("b")], ["second"])
+        self.assertEqual(bus.stats(), {("a", "b"): {"sent": 2, "delivered": 2, "dropped": 0}})
+
+    def test_block_times_out_and_drops(self):
+        bus = MessageBus(self.observable, maxsize=1, policy=BLOCK, block_timeout_sec=0.05)
+        bus.register("a")
+        bus.register("b")
+        bus.send("a", "b", "first")
+
+        self.assertFalse(bus.send("a", "b", "second"))
+        self.assertEqual(bus.stats()[("a", "b")], {"sent": 2, "delivered": 0, "dropped": 1})
+        self.assertEqual(self.events[-1], ("message.dropped", "b", "second"))
+
+    def test_recipients_are_woken_before_a_blocking_wait(self):
+        bus = MessageBus(self.observable, maxsize=1, policy=BLOCK, block_timeout_sec=5)
+        bus.register("a")
+        bus.register("full")
+        bus.send("a", "full", "first")
+
+        # "drainer" (sorted first) drains "full" once it gets its message, the publish blocks on "full" until then
+        def drain():
+            bus.receive("drainer")
+            bus.receive("full")
+        bus.register("drainer", on_ready=lambda: threading.Thread(target=drain).start())
+        for agent_id in ("drainer", "full"):
+            bus.join("news", agent_id)
+
+        self.assertEqual(bus.publish("a", "news", "second"), 2)
+        self.assertEqual(bus.stats()[("a", "full")], {"sent": 2, "delivered": 1, "dropped": 0})
+
+if __name__ == "__main__":
+    unittest.main()
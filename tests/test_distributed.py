@@ -0,0 +1,97 @@
+import os
+import time
+import socket
+import tempfile
+import threading
+import unittest
+from myctest.config import MycConfig
+from myctest.scenario import get_scenarios
+from myctest.distributed import Coordinator, Worker
+
+SCENARIO = """name: slow
+iterations: 6
+timeout_sec: 5
+wait_for_agents: false
+test_runner_path: ./runner.py
+agents:
+  - system_prompt: hi
+environment:
+  default_state:
+    fs:
+  desired_state_schema:
+    fs:
+      filepath: Hello world
+"""
+
+# iteration 1 takes long enough for the test to kill the worker running it
+RUNNER = """import time
+import threading
+from myctest.runner import BaseTestRunner
+
+class TestRunner(BaseTestRunner):
+    def before(self, scenario, environment):
+        environment.register_action("write", lambda env: env.state.set_in(("fs", "filepath"), "Hello world"))
+
+    def before_iteration(self, scenario, environment, iteration):
+        if iteration.index == 1:
+            time.sleep(1)
+        environment.execute_action("write")
+"""
+
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        root_dir = self.directory.name
+        with open(os.path.join(root_dir, "slow.myc-scenario.yml"), "w") as stream:
+            stream.write(SCENARIO)
+        with open(os.path.join(root_dir, "runner.py"), "w") as stream:
+            stream.write(RUNNER)
+
+        self.config = MycConfig()
+        self.config.root_dir = root_dir
+        self.config.cache_dir = os.path.join(root_dir, ".myctest")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unit_of_lost_worker_is_requeued(self):
+        coordinator = Coordinator(self.config, get_scenarios(self.config, None), port=0)
+        listening = threading.Event()
+        results = []
+        coordinator_thread = threading.Thread(target=lambda: results.extend(coordinator.run(lambda _: listening.set())))
+        coordinator_thread.start()
+        self.assertTrue(listening.wait(10))
+
+        workers = [Worker(self.config, "127.0.0.1", coordinator.port, "worker-%d" % index, heartbeat_interval_sec=0.2) for index in range(3)]
+        threads = [threading.Thread(target=self._run_worker, args=(worker,), daemon=True) for worker in workers]
+        for thread in threads:
+            thread.start()
+
+        # kill the worker that got iteration 1 while it runs it
+        unit = ("slow.myc-scenario.yml", 1)
+        deadline = time.time() + 10
+        victim = None
+        while victim is None and time.time() < deadline:
+            victim = next((worker_id for worker_id, in_flight in list(coordinator.in_flight.items()) if in_flight == unit), None)
+            time.sleep(0.01)
+        self.assertIsNotNone(victim)
+        next(worker for worker in workers if worker.worker_id == victim).connection.shutdown(socket.SHUT_RDWR)
+
+        coordinator_thread.join(30)
+        self.assertFalse(coordinator_thread.is_alive())
+
+        [result] = results
+        self.assertIsNone(result.error)
+        self.assertEqual([iteration.index for iteration in result.iterations], list(range(6)))
+        self.assertTrue(all(iteration.passed for iteration in result.iterations))
+        self.assertEqual(coordinator.attempts[unit], 2)
+
+    def _run_worker(self, worker: Worker):
+        try:
+            worker.run()
+        except OSError:
+            # the killed worker fails to report its unit
+            pass
+
+if __name__ == "__main__":
+    unittest.main()
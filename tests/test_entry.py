@@ -0,0 +1,23 @@
+import sys
+import subprocess
+import unittest
+from myctest.entry import parse_list_args
+
+class ParseListArgsTest(unittest.TestCase):
+    def test_list_command_lines(self):
+        self.assertEqual(parse_list_args(["list"]), [])
+        self.assertEqual(parse_list_args(["list", "-k", "a", "--select=b"]), ["a", "b"])
+        # a selection before the command wins, as in the typer app
+        self.assertEqual(parse_list_args(["-k", "a", "list", "-k", "b"]), ["a"])
+
+    def test_other_command_lines_go_to_typer(self):
+        for args in ([], ["-w", "2"], ["list", "--help"], ["-w", "2", "list"], ["worker", "--connect", "x:1"], ["list", "-k"]):
+            self.assertIsNone(parse_list_args(args), args)
+
+    def test_list_does_not_import_typer(self):
+        code = "import sys; from myctest.entry import main; sys.argv = ['myc-test', 'list', '-k', 'nothing-matches']; main(); print('typer' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+        self.assertEqual(output.strip(), "False")
+
+if __name__ == "__main__":
+    unittest.main()
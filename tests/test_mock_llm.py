@@ -0,0 +1,66 @@
+import os
+import json
+import time
+import asyncio
+import unittest
+from unittest import mock
+from myctest import replay
+from myctest.mock_llm import MockLLMClient
+from myctest.ratelimit import RateLimitExceeded
+
+METADATA = {
+    "mock_llm": {
+        "seed": 1,
+        "latency": {"distribution": "constant", "value_sec": 0.05},
+        "rate_limit": {"rpm": 60, "burst": 2, "on_limit": "error"},
+        "replies": [
+            {
+                "match": "change file",
+                "tool_calls": [{"name": "send_message", "arguments": {"agent_id": "employee", "message": "Please do: {last_message}"}}],
+            },
+            {"content": "Done, turn {turn}"},
+        ],
+    }
+}
+
+def create(client, content):
+    return client.chat.completions.create(model="gpt-4", messages=[{"role": "user", "content": content}])
+
+class MockLLMClientTest(unittest.TestCase):
+    def test_wrap_client_builds_a_mock_per_agent(self):
+        with mock.patch.dict(os.environ, {replay.BACKEND_ENV: replay.MOCK}):
+            client = replay.wrap_client(object(), metadata=METADATA, agent_id="boss")
+        self.assertIsInstance(client, MockLLMClient)
+        self.assertEqual(client.agent_id, "boss")
+
+    def test_scripted_tool_calls(self):
+        client = MockLLMClient.from_metadata(METADATA, "boss")
+        completion = create(client, "please change file")
+        message = completion.choices[0].message
+        [tool_call] = message.tool_calls
+        self.assertEqual(completion.choices[0].finish_reason, "tool_calls")
+        self.assertEqual(tool_call.function.name, "send_message")
+        self.assertEqual(json.loads(tool_call.function.arguments), {"agent_id": "employee", "message": "Please do: please change file"})
+
+        # no match, the unmatched reply is used
+        self.assertEqual(create(client, "hello").choices[0].message.content, "Done, turn 1")
+
+    def test_latency(self):
+        client = MockLLMClient.from_metadata(METADATA)
+        start = time.perf_counter()
+        create(client, "hello")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+        start = time.perf_counter()
+        asyncio.run(client.chat.completions.acreate(model="gpt-4", messages=[{"role": "user", "content": "hello"}]))
+        self.assertGreaterEqual(time.perf_counter() - start, 0.05)
+
+    def test_on_limit_error(self):
+        client = MockLLMClient.from_metadata(METADATA)
+        create(client, "hello")
+        create(client, "hello")
+        with self.assertRaises(RateLimitExceeded):
+            create(client, "hello")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import asyncio
+import tempfile
+import unittest
+from myctest.config import MycConfig
+from myctest.scenario import get_scenarios
+from myctest.runner import import_test_runner, AsyncBaseTestRunner
+
+SCENARIO = """name: threads
+iterations: 4
+concurrency: 2
+timeout_sec: 5
+wait_for_agents: false
+test_runner_path: ./runner.py
+agents:
+  - system_prompt: hi
+environment:
+  default_state:
+    fs:
+  desired_state_schema:
+    fs:
+      f: ok
+"""
+
+# agents run on their own threads, started without the iteration's context
+THREAD_RUNNER = """import threading
+from myctest.runner import BaseTestRunner
+
+class TestRunner(BaseTestRunner):
+    def before(self, scenario, environment):
+        environment.register_action("write", lambda env, value: env.state.set_in(("fs", "f"), value))
+
+    def before_iteration(self, scenario, environment, iteration):
+        threading.Timer(0.05, lambda: self.environment.execute_action("write", "ok")).start()
+"""
+
+ASYNC_THREAD_RUNNER = """import threading
+from myctest.runner import AsyncBaseTestRunner
+
+class TestRunner(AsyncBaseTestRunner):
+    async def before(self, scenario, environment):
+        environment.register_action("write", lambda env, value: env.state.set_in(("fs", "f"), value))
+
+    async def before_iteration(self, scenario, environment, iteration):
+        threading.Timer(0.05, lambda: self.environment.execute_action("write", "ok")).start()
+"""
+
+SEQUENTIAL_SCENARIO = SCENARIO.replace("iterations: 4", "iterations: 40").replace("concurrency: 2", "concurrency: 4") + "target_pass_rate: 0.5\n"
+
+# records which iterations started and which ran their after_iteration hook
+RECORDING_RUNNER = """import asyncio
+from myctest.runner import AsyncBaseTestRunner
+
+class TestRunner(AsyncBaseTestRunner):
+    started = []
+    finished = []
+
+    async def before(self, scenario, environment):
+        environment.register_action("write", lambda env, value: env.state.set_in(("fs", "f"), value))
+
+    async def before_iteration(self, scenario, environment, iteration):
+        self.started.append(iteration.index)
+        await asyncio.sleep(0.02 * (iteration.index % 3))
+        environment.execute_action("write", "ok")
+
+    async def after_iteration(self, scenario, environment, iteration):
+        self.finished.append(iteration.index)
+"""
+
+def load_runner(root_dir: str, scenario: str, runner: str):
+    with open(os.path.join(root_dir, "test.myc-scenario.yml"), "w") as stream:
+        stream.write(scenario)
+    with open(os.path.join(root_dir, "runner.py"), "w") as stream:
+        stream.write(runner)
+
+    config = MycConfig()
+    config.root_dir = root_dir
+    config.cache_dir = os.path.join(root_dir, ".myctest")
+    [(_, scenario)] = get_scenarios(config, None)
+    return import_test_runner(scenario.test_runner_path)(scenario)
+
+def run(runner):
+    if isinstance(runner, AsyncBaseTestRunner):
+        return asyncio.run(runner.run())
+    return runner.run()
+
+class ConcurrentIterationsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_threads_write_to_their_iterations_environment(self):
+        runner = load_runner(self.directory.name, SCENARIO, THREAD_RUNNER)
+        iterations = run(runner)
+        self.assertEqual([iteration.passed for iteration in iterations], [True] * 4)
+        # iterations ran on forks, the runner's own environment is untouched
+        self.assertIsNone(runner.environment.state.get_in(("fs", "f")))
+
+    def test_threads_write_to_their_iterations_environment_async(self):
+        runner = load_runner(self.directory.name, SCENARIO, ASYNC_THREAD_RUNNER)
+        iterations = run(runner)
+        self.assertEqual([iteration.passed for iteration in iterations], [True] * 4)
+        self.assertIsNone(runner.environment.state.get_in(("fs", "f")))
+
+    def test_started_iterations_are_reported_once_decided_async(self):
+        runner = load_runner(self.directory.name, SEQUENTIAL_SCENARIO, RECORDING_RUNNER)
+        iterations = run(runner)
+        self.assertTrue(runner.sequential_test.decided)
+        self.assertLess(len(iterations), 40)
+        # nothing is cancelled: every started iteration finished and is reported
+        self.assertEqual(sorted(runner.started), sorted(runner.finished))
+        self.assertEqual([iteration.index for iteration in iterations], sorted(runner.started))
+
+if __name__ == "__main__":
+    unittest.main()
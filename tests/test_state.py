@@ -0,0 +1,70 @@
+import random
+import unittest
+from myctest.state import PersistentMap, MISSING, freeze, thaw
+
+class Key:
+    # few distinct hashes, so keys share buckets
+    def __init__(self, value: int):
+        self.value = value
+
+    def __hash__(self):
+        return self.value % 7
+
+    def __eq__(self, other):
+        return isinstance(other, Key) and other.value == self.value
+
+    def __repr__(self):
+        return "Key(%d)" % self.value
+
+def expected_diff(a: dict, b: dict) -> dict:
+    return {
+        key: (a.get(key, MISSING), b.get(key, MISSING))
+        for key in set(a) | set(b)
+        if a.get(key, MISSING) != b.get(key, MISSING)
+    }
+
+class PersistentMapTest(unittest.TestCase):
+    def test_matches_dict_under_random_operations(self):
+        rng = random.Random(7)
+        for make_key in (lambda value: value, lambda value: "k%d" % value, Key):
+            reference = {}
+            current = PersistentMap()
+            versions = [(current, dict(reference))]
+            for _ in range(1000):
+                key = make_key(rng.randrange(200))
+                if key in reference and rng.random() < 0.4:
+                    del reference[key]
+                    current = current.delete(key)
+                else:
+                    value = rng.randrange(5)
+                    reference[key] = value
+                    current = current.set(key, value)
+
+                self.assertEqual(len(current), len(reference))
+                self.assertEqual(dict(current.items()), reference)
+                self.assertEqual(current.get(key, MISSING), reference.get(key, MISSING))
+                if rng.random() < 0.05:
+                    versions.append((current, dict(reference)))
+
+            # old versions are untouched, and diffs between any two match the dicts'
+            for version, snapshot in versions:
+                self.assertEqual(dict(version.items()), snapshot)
+                self.assertEqual(version.diff(current), expected_diff(snapshot, reference))
+                self.assertEqual(current.diff(version), expected_diff(reference, snapshot))
+
+    def test_delete_missing_key_raises(self):
+        with self.assertRaises(KeyError):
+            PersistentMap({"a": 1}).delete("b")
+
+    def test_set_same_value_returns_same_map(self):
+        value = object()
+        state = PersistentMap({"a": value})
+        self.assertIs(state.set("a", value), state)
+        self.assertEqual(state.diff(state.set("a", value)), {})
+
+    def test_freeze_and_thaw(self):
+        value = {"fs": {"a": [1, {"b": 2}]}, "n": None}
+        self.assertEqual(thaw(freeze(value)), value)
+
+if __name__ == "__main__":
+    unittest.main()
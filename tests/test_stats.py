@@ -0,0 +1,37 @@
+import unittest
+from myctest.stats import SequentialTest, PASSED, FAILED, wilson_interval
+
+def iterations_to_decide(target: float, passed: bool):
+    test = SequentialTest(target)
+    while not test.decided:
+        test.add(passed)
+    return test.decision, test.total
+
+class SequentialTestTest(unittest.TestCase):
+    def test_decision_counts(self):
+        # confidence 0.95, indifference 0.1: (target, result of every iteration) -> (decision, iterations)
+        expected = {
+            (0.5, True): (PASSED, 8),
+            (0.5, False): (FAILED, 8),
+            (0.8, True): (PASSED, 12),
+            (0.8, False): (FAILED, 3),
+            (1.0, True): (PASSED, 28),
+            (1.0, False): (FAILED, 1),
+        }
+        for (target, passed), decision in expected.items():
+            self.assertEqual(iterations_to_decide(target, passed), decision, (target, passed))
+
+    def test_mixed_results_at_the_target_stay_undecided_longer(self):
+        test = SequentialTest(0.5)
+        for index in range(20):
+            test.add(index % 2 == 0)
+        self.assertFalse(test.decided)
+
+    def test_wilson_interval(self):
+        self.assertEqual(wilson_interval(0, 0), (0.0, 1.0))
+        low, high = wilson_interval(8, 10)
+        self.assertAlmostEqual(low, 0.490, places=3)
+        self.assertAlmostEqual(high, 0.943, places=3)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+from myctest.state import freeze
+from myctest.validation import CompiledStateSchema, StateValidator
+
+SCHEMA = {"fs": {"dir": {"file": "Hello world"}, "other": 1}, "flag": True}
+
+class StateValidatorTest(unittest.TestCase):
+    def setUp(self):
+        self.state = freeze({"fs": {"dir": {"file": "Hello world"}, "other": 1}, "flag": True})
+        self.validator = StateValidator(CompiledStateSchema(SCHEMA))
+
+    def set(self, path: tuple, value):
+        # rebuilds the path the way Environment writes do, then invalidates it
+        def set_in(node, keys):
+            if not keys:
+                return freeze(value)
+            return node.set(keys[0], set_in(node.get(keys[0], freeze({})), keys[1:]))
+        self.state = set_in(self.state, path)
+        self.validator.invalidate(path)
+
+    def validate(self) -> bool:
+        return self.validator.validate(lambda: self.state)
+
+    def test_parent_path_set_invalidates_and_is_satisfied_again(self):
+        self.assertTrue(self.validate())
+
+        # replacing a parent drops the nested file
+        self.set(("fs",), {"other": 1})
+        self.assertFalse(self.validate())
+        self.assertEqual([str(constraint) for constraint in self.validator.unsatisfied()], ["fs.dir.file == 'Hello world'"])
+
+        self.set(("fs", "dir"), {"file": "Hello world"})
+        self.assertTrue(self.validate())
+        self.assertEqual(self.validator.unsatisfied(), [])
+
+    def test_child_path_set_invalidates(self):
+        self.assertTrue(self.validate())
+        self.set(("fs", "dir", "file"), "Bye")
+        self.assertFalse(self.validate())
+        self.set(("fs", "dir", "file"), "Hello world")
+        self.assertTrue(self.validate())
+
+    def test_unrelated_paths_are_not_checked(self):
+        self.assertTrue(self.validate())
+        # the state changes without an invalidation of its path, only the invalidated sibling is checked
+        self.state = self.state.set("flag", False)
+        self.validator.invalidate(("fs", "other"))
+        self.assertTrue(self.validate())
+
+        self.validator.invalidate(("flag",))
+        self.assertFalse(self.validate())
+
+if __name__ == "__main__":
+    unittest.main()